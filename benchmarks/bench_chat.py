@@ -0,0 +1,159 @@
+"""End-to-end benchmark of /chat and /chat/stream against the fake Ollama server.
+
+Starts ``fake_ollama`` and the embeddings API on local ports, ingests the
+documents under ``--data-path`` into a scratch store, then sends the same
+deterministic question list to both endpoints. Reports request latency,
+time to first token for the stream, and the per-stage means from ``/metrics``.
+
+    python -m benchmarks.bench_chat --requests 100 --concurrency 4
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import httpx
+from .common import REPO_ROOT, app_module, free_port, latency_summary, serve_in_background, write_results
+from .fake_ollama import add_server_arguments, create_app as create_fake_ollama, server_options
+
+QUESTIONS = (
+    "How do I authenticate with the API?",
+    "What does error AUTH_001 mean?",
+    "How do I create a project?",
+    "Which webhook events are supported?",
+    "How do I list tasks in a project?",
+    "What are the rate limits?",
+    "How do I retry a failed webhook delivery?",
+    "How do I update a task's status?",
+)
+STAGE_PATTERN = re.compile(r'^embeddings_api_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+def chat_body(question, index):
+    # Number the questions so an enabled response cache does not turn the run into cache hits
+    return {"text": {"messages": [{"role": "user", "content": f"{question} (request {index})"}]}}
+
+
+async def run_chat(client, index):
+    started = time.perf_counter()
+    response = await client.post("/chat", json=chat_body(QUESTIONS[index % len(QUESTIONS)], index))
+    response.raise_for_status()
+    return {"total": time.perf_counter() - started}
+
+
+async def run_stream(client, index):
+    started = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/chat/stream", json=chat_body(QUESTIONS[index % len(QUESTIONS)], index)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token is None and line.startswith("data: ") and '"content"' in line:
+                first_token = time.perf_counter() - started
+    return {"total": time.perf_counter() - started, "first_token": first_token}
+
+
+async def drive(base_url, endpoint, requests, concurrency):
+    run = run_stream if endpoint == "/chat/stream" else run_chat
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0) as client:
+        async def limited(index):
+            async with semaphore:
+                return await run(client, index)
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(limited(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "requests_per_s": requests / elapsed,
+        "latency": latency_summary([sample["total"] for sample in samples]),
+    }
+    if endpoint == "/chat/stream":
+        result["first_token"] = latency_summary([sample["first_token"] for sample in samples if sample["first_token"] is not None])
+    return result
+
+
+def stage_means(metrics_text):
+    """Mean seconds per stage from the ``embeddings_api_stage_seconds`` histogram."""
+    sums, counts = {}, {}
+    for kind, stage, value in STAGE_PATTERN.findall(metrics_text):
+        (sums if kind == "sum" else counts)[stage] = float(value)
+    return {stage: {"count": int(counts[stage]), "mean_ms": sums[stage] / counts[stage] * 1000.0} for stage in counts if counts[stage]}
+
+
+@contextlib.contextmanager
+def chat_stack(args):
+    """Start the fake Ollama and the API on local ports; yields the API base URL and the seconds until it was ready.
+
+    The app reads its settings once, at import, so this can run once per process.
+    """
+    fake_ollama_port, api_port = free_port(), free_port()
+    fake_ollama = serve_in_background(create_fake_ollama(**server_options(args)), fake_ollama_port)
+
+    # The store and the embedding cache live relative to the working directory
+    work_dir = tempfile.mkdtemp(prefix="chat-bench-")
+    previous_dir = os.getcwd()
+    os.environ.update({
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_ollama_port}",
+        "EMBEDDINGS_DATA_PATH": os.path.abspath(args.data_path),
+        "EMBEDDING_CACHE_PATH": "",
+        "INGEST_WORKERS": "1",
+    })
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+    os.makedirs(os.path.join(work_dir, "embeddings"))
+    os.chdir(work_dir)
+    api = None
+    try:
+        started = time.perf_counter()
+        app = app_module().app
+        api = serve_in_background(app, api_port)
+        base_url = f"http://127.0.0.1:{api_port}"
+        # The store loads in the background after startup
+        while httpx.get(f"{base_url}/ready").status_code != 200:
+            time.sleep(0.05)
+        startup_s = time.perf_counter() - started
+        logging.disable(logging.INFO)
+        yield base_url, startup_s
+    finally:
+        if api is not None:
+            api.should_exit = True
+        fake_ollama.should_exit = True
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def add_stack_arguments(parser):
+    parser.add_argument("--data-path", default=os.path.join(REPO_ROOT, "data"))
+    parser.add_argument("--response-cache", action="store_true", help="Keep the response cache enabled")
+    add_server_arguments(parser)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/chat-<time>.json)")
+    add_stack_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with chat_stack(args) as (base_url, startup_s):
+        results = {"startup_s": startup_s}
+        for endpoint in ("/chat", "/chat/stream"):
+            results[endpoint] = asyncio.run(drive(base_url, endpoint, args.requests, args.concurrency))
+            latency = results[endpoint]["latency"]
+            print(f"{endpoint:>12}: {results[endpoint]['requests_per_s']:.1f} req/s, p50 {latency['p50_ms']:.1f}ms, p95 {latency['p95_ms']:.1f}ms")
+        results["stages"] = stage_means(httpx.get(f"{base_url}/metrics").text)
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("chat", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""HyperDB micro-benchmarks on synthetic MiniLM-width corpora.
+
+For every corpus size and variant (search index, quantization and/or on-disk
+dtype) this measures ``add_documents`` throughput, ``finalize`` (index build),
+``save`` and ``load`` time, per-query latency at several ``top_k`` values on
+the loaded, memory-mapped store, how far the resident set grows while querying,
+batched query throughput, and recall@k against exact cosine search over the
+same vectors.
+
+    python -m benchmarks.bench_hyperdb --sizes 10000,100000 --variants flat,ivf,sq8
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+from .common import (
+    EMBEDDING_DIM,
+    Stopwatch,
+    app_module,
+    latency_summary,
+    peak_rss_mb,
+    reset_peak_rss,
+    rss_mb,
+    synthetic_corpus,
+    synthetic_queries,
+    write_results,
+)
+
+# Variant name -> HyperDB keyword arguments, plus the ``dtype`` the store is saved with
+VARIANTS = {
+    "flat": {"index": "flat"},
+    "flat-f16": {"index": "flat", "dtype": "float16"},
+    "ivf": {"index": "ivf"},
+    "hnsw": {"index": "hnsw"},
+    "sq8": {"index": "flat", "quantization": "sq8"},
+    "pq": {"index": "flat", "quantization": "pq"},
+    "ivf-sq8": {"index": "ivf", "quantization": "sq8"},
+}
+QUERY_BLOCK = 16
+
+
+def exact_neighbours(vectors, queries, top_k):
+    """Ground-truth cosine top_k rows per query, computed block by block."""
+    top_k_indices = app_module("src.lib.galaxy_brain_math").top_k_indices
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    truth = []
+    for start in range(0, len(queries), QUERY_BLOCK):
+        block = queries[start:start + QUERY_BLOCK]
+        block = block / np.linalg.norm(block, axis=1, keepdims=True)
+        similarities = (vectors @ block.T) / norms[:, np.newaxis]
+        truth.extend(top_k_indices(similarities, top_k))
+    return truth
+
+
+def row_of(document):
+    # Synthetic chunks are named "synthetic chunk <row>"
+    return int(document["content"].rsplit(" ", 1)[1])
+
+
+def recall(results, truth, top_k):
+    hits = [len({row_of(document) for document in result} & set(rows[:top_k].tolist())) for result, rows in zip(results, truth)]
+    return float(np.sum(hits) / (len(truth) * top_k))
+
+
+def bench_variant(HyperDB, variant, size, dim, queries, truth, top_ks, batch_size, store_dir, seed):
+    documents, vectors = synthetic_corpus(size, dim, seed=seed)
+
+    def embed_queries(texts):
+        return [queries[int(text[1:])] for text in texts]
+
+    options = dict(VARIANTS[variant])
+    dtype = options.pop("dtype", "float32")
+    db = HyperDB(vectors=np.empty((0, 0), dtype=np.float32), embedding_function=embed_queries, **options)
+    with Stopwatch() as add:
+        for start in range(0, size, batch_size):
+            db.add_documents(documents[start:start + batch_size], vectors[start:start + batch_size])
+    del documents, vectors
+    with Stopwatch() as finalize:
+        db.finalize()
+
+    store_path = os.path.join(store_dir, f"{variant}-{size}.hyperdb")
+    with Stopwatch() as save:
+        db.save(store_path, dtype=dtype)
+    store_mb = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path)) / (1024 * 1024)
+    del db
+    with Stopwatch() as load:
+        db = HyperDB.from_storage(store_path, embedding_function=embed_queries, **options)
+
+    query_texts = [f"q{i}" for i in range(len(queries))]
+    by_top_k = {}
+    rss_before = rss_mb()
+    reset_peak_rss()
+    for top_k in top_ks:
+        # One warm-up query so page faults on the memory map are not charged to the first sample
+        db.query(query_texts[0], top_k=top_k)
+        samples, results = [], []
+        for query_text in query_texts:
+            with Stopwatch() as query:
+                result = db.query(query_text, top_k=top_k, return_similarities=False)
+            samples.append(query.seconds)
+            results.append(result)
+        by_top_k[str(top_k)] = {
+            "latency": latency_summary(samples),
+            "recall": recall(results, truth, top_k),
+        }
+    peak_rss = peak_rss_mb()
+    with Stopwatch() as batch:
+        db.query_batch(query_texts, top_k=max(top_ks), return_similarities=False)
+    shutil.rmtree(store_path)
+
+    return {
+        "variant": variant,
+        "rows": size,
+        "add_documents_s": add.seconds,
+        "add_rows_per_s": size / add.seconds if add.seconds else None,
+        "finalize_s": finalize.seconds,
+        "save_s": save.seconds,
+        "store_mb": store_mb,
+        "load_s": load.seconds,
+        "query": by_top_k,
+        # Mapped store pages plus any per-query copies; a float16 store should not grow by a float32 copy
+        "query_rss_growth_mb": peak_rss - rss_before if peak_rss is not None and rss_before is not None else None,
+        "query_batch_qps": len(query_texts) / batch.seconds if batch.seconds else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--variants", default="flat,flat-f16,ivf,sq8", help=f"Comma-separated, from {', '.join(VARIANTS)}")
+    parser.add_argument("--top-k", default="1,10,50", help="Comma-separated top_k values")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per add_documents call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-dir", default=None, help="Scratch directory for stores (default: a temp dir)")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/hyperdb-<time>.json)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    variants = args.variants.split(",")
+    top_ks = [int(top_k) for top_k in args.top_k.split(",")]
+    unknown = [variant for variant in variants if variant not in VARIANTS]
+    if unknown:
+        parser.error(f"Unknown variants {unknown}; choose from {', '.join(VARIANTS)}")
+
+    HyperDB = app_module("src.lib.hyperdb").HyperDB
+    store_dir = args.store_dir or tempfile.mkdtemp(prefix="hyperdb-bench-")
+    queries = synthetic_queries(args.queries, args.dim, seed=args.seed)
+    results = []
+    try:
+        for size in sizes:
+            _, vectors = synthetic_corpus(size, args.dim, seed=args.seed)
+            truth = exact_neighbours(vectors, queries, max(top_ks))
+            del vectors
+            for variant in variants:
+                result = bench_variant(
+                    HyperDB, variant, size, args.dim, queries, truth, top_ks, args.batch_size, store_dir, args.seed
+                )
+                top = result["query"][str(max(top_ks))]
+                print(
+                    f"{variant:>8} {size:>8} rows: add {result['add_rows_per_s']:.0f} rows/s, "
+                    f"finalize {result['finalize_s']:.2f}s, save {result['save_s']:.2f}s, load {result['load_s']:.3f}s, "
+                    f"query@{max(top_ks)} p50 {top['latency']['p50_ms']:.2f}ms recall {top['recall']:.3f}"
+                    + (f", query RSS +{result['query_rss_growth_mb']:.0f}MB" if result["query_rss_growth_mb"] is not None else "")
+                )
+                results.append(result)
+    finally:
+        if args.store_dir is None:
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "store_dir")}
+    write_results("hyperdb", config, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
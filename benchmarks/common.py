@@ -0,0 +1,181 @@
+"""Shared helpers for the benchmark scripts: app imports, synthetic data, timing and result files."""
+import datetime
+import importlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+EMBEDDING_DIM = 384  # all-minilm, the default OLLAMA_EMBEDDINGS_MODEL
+APP_PACKAGE = "embeddings-api"
+
+
+def app_module(name=""):
+    """Import the ``embeddings-api`` app, or one of its modules without starting the app.
+
+    The package ``__init__`` builds the FastAPI app, which loads the store and
+    contacts Ollama; library modules are imported through a bare package
+    object instead so HyperDB benchmarks need neither.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if not name:
+        return importlib.import_module(APP_PACKAGE)
+    if APP_PACKAGE not in sys.modules:
+        package = types.ModuleType(APP_PACKAGE)
+        package.__path__ = [os.path.join(REPO_ROOT, APP_PACKAGE)]
+        sys.modules[APP_PACKAGE] = package
+    return importlib.import_module(f"{APP_PACKAGE}.{name}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_background(app, port, host="127.0.0.1"):
+    """Run an ASGI app with uvicorn on a daemon thread; returns the server, stop it with ``should_exit = True``."""
+    import uvicorn
+
+    class BackgroundServer(uvicorn.Server):
+        def install_signal_handlers(self):
+            # Signal handlers can only be installed from the main thread
+            pass
+
+    server = BackgroundServer(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Server on {host}:{port} failed to start")
+        time.sleep(0.01)
+    return server
+
+
+def synthetic_corpus(rows, dim=EMBEDDING_DIM, n_clusters=256, seed=0):
+    """Clustered unit-ish vectors with source/content documents, deterministic for a given seed.
+
+    Pure Gaussian noise has no neighbourhood structure, which makes every ANN
+    index look equally bad; clusters give recall numbers closer to real text.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, n_clusters, rows)
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 100000):
+        block = assignments[start:start + 100000]
+        vectors[start:start + len(block)] = centroids[block] + 0.6 * rng.standard_normal((len(block), dim)).astype(np.float32)
+    documents = [
+        {"source": f"data/synthetic-{i % 1000:03d}.md", "content": f"synthetic chunk {i}", "description": f"synthetic chunk {i}"}
+        for i in range(rows)
+    ]
+    return documents, vectors
+
+
+def synthetic_queries(count, dim=EMBEDDING_DIM, n_clusters=256, seed=0):
+    """Queries drawn around the same centroids as ``synthetic_corpus`` with the same seed."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    query_rng = np.random.default_rng(seed + 1)
+    picks = query_rng.integers(0, n_clusters, count)
+    return centroids[picks] + 0.6 * query_rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def latency_summary(samples):
+    """Seconds in, milliseconds out."""
+    samples = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(samples):
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+    }
+
+
+def reset_peak_rss():
+    """Start a new peak resident-set window; Linux only, elsewhere peak_rss_mb() returns None."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    return _proc_status_mb("VmRSS")
+
+
+def peak_rss_mb():
+    """Peak resident set since the last reset_peak_rss(), including mapped store pages."""
+    return _proc_status_mb("VmHWM")
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.started
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(name, config, results, output=None):
+    """Write one JSON result file and return its path; defaults to ``benchmarks/results/<name>-<utc time>.json``."""
+    started = datetime.datetime.now(datetime.timezone.utc)
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    payload = {
+        "benchmark": name,
+        "timestamp": started.isoformat(),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Wrote {output}")
+    return output
@@ -0,0 +1,60 @@
+"""Compare two benchmark result files of the same kind.
+
+Prints every numeric result that appears in both runs with the relative
+change, so a commit can be checked against a baseline run:
+
+    python -m benchmarks.compare benchmarks/results/hyperdb-A.json benchmarks/results/hyperdb-B.json
+"""
+import argparse
+import json
+
+
+def flatten(value, prefix=""):
+    """Numeric leaves as ``{"path/to/leaf": number}``; list items are keyed by variant and rows, or concurrency."""
+    if isinstance(value, dict):
+        leaves = {}
+        for key, item in value.items():
+            leaves.update(flatten(item, f"{prefix}{key}/"))
+        return leaves
+    if isinstance(value, list):
+        leaves = {}
+        for i, item in enumerate(value):
+            if isinstance(item, dict) and "variant" in item:
+                name = f"{item['variant']}@{item['rows']}"
+            elif isinstance(item, dict) and "concurrency" in item:
+                name = f"concurrency-{item['concurrency']}"
+            else:
+                name = str(i)
+            leaves.update(flatten(item, f"{prefix}{name}/"))
+        return leaves
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix.rstrip("/"): value}
+    return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["benchmark"] != candidate["benchmark"]:
+        parser.error(f"Cannot compare a {baseline['benchmark']} run with a {candidate['benchmark']} run")
+    if baseline["config"] != candidate["config"]:
+        print("Warning: the two runs used different configurations")
+
+    before, after = flatten(baseline["results"]), flatten(candidate["results"])
+    width = max((len(key) for key in before if key in after), default=0)
+    for key in before:
+        if key not in after:
+            continue
+        change = f"{(after[key] - before[key]) / before[key] * 100:+.1f}%" if before[key] else "n/a"
+        print(f"{key:<{width}}  {before[key]:>12.4g}  {after[key]:>12.4g}  {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
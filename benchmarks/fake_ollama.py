@@ -0,0 +1,203 @@
+"""Deterministic stand-in for the Ollama HTTP API.
+
+Embeddings are seeded from a hash of the model and prompt, and generations
+are words picked by a hash of the prompt, so repeated runs against the same
+data produce identical stores and answers without a GPU or model download.
+Latency per token and a failure rate can be set to load-test the API layer
+against a slow or flaky model server.
+
+    python -m benchmarks.fake_ollama --port 11434 --token-latency 0.02 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from .common import EMBEDDING_DIM
+
+VOCABULARY = (
+    "the api returns a task project webhook token request response error code with for and to of in "
+    "status user create update delete list field value header key limit page event retry"
+).split()
+
+
+def _rng(*parts):
+    digest = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+def fake_embedding(model, prompt, dim=EMBEDDING_DIM):
+    return _rng("embedding", model, prompt).standard_normal(dim).astype(np.float32).tolist()
+
+
+def fake_tokens(model, prompt, count):
+    words = _rng("generate", model, prompt).choice(VOCABULARY, count)
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime())
+
+
+def _failure_response():
+    return JSONResponse({"error": "injected failure"}, status_code=500)
+
+
+def create_app(
+    dim=EMBEDDING_DIM,
+    tokens=32,
+    token_latency=0.0,
+    prompt_latency=0.0,
+    embedding_latency=0.0,
+    failure_rate=0.0,
+    failure_mode="status",
+    embedding_failure_rate=0.0,
+    seed=0,
+):
+    """FastAPI app serving ``/api/embeddings``, ``/api/generate``, ``/api/chat`` and ``/api/tags``.
+
+    ``prompt_latency`` is spent before the first token and ``token_latency``
+    before each one. A ``failure_rate`` fraction of generations fails: with
+    ``failure_mode="status"`` they get a 500, with ``"disconnect"`` the stream
+    is cut off halfway. ``embedding_failure_rate`` is kept separate because the
+    API refuses to start when ingestion embeddings fail. ``prompt_eval_count``
+    only counts the prompt words after the prefix shared with the previous
+    request for the same model, the way Ollama reuses its KV cache.
+    """
+    if failure_mode not in ("status", "disconnect"):
+        raise ValueError(f"Unknown failure mode '{failure_mode}'. Use status or disconnect.")
+    app = FastAPI(title="Fake Ollama")
+    failures = random.Random(seed)
+
+    def should_fail(rate):
+        return rate > 0 and failures.random() < rate
+
+    @app.get("/")
+    async def root():
+        return "Ollama is running"
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": []}
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        if embedding_latency:
+            await asyncio.sleep(embedding_latency)
+        if should_fail(embedding_failure_rate):
+            return _failure_response()
+        return {"embedding": fake_embedding(body.get("model", ""), body.get("prompt", ""), dim)}
+
+    # Prompt words of the previous request per model, standing in for the KV cache of Ollama's single slot
+    cached_prompts = {}
+
+    def prompt_eval_count(model, words):
+        previous = cached_prompts.get(model, [])
+        reused = 0
+        while reused < min(len(previous), len(words)) and previous[reused] == words[reused]:
+            reused += 1
+        cached_prompts[model] = words
+        return len(words) - reused
+
+    async def generation(body, prompt, words, frame):
+        """Generate from ``prompt``; ``frame(text)`` gives the endpoint-specific fields of one message"""
+        model, streaming = body.get("model", ""), body.get("stream", True)
+        pieces = fake_tokens(model, prompt, tokens)
+        fail = should_fail(failure_rate)
+        if fail and (failure_mode == "status" or not streaming):
+            return _failure_response()
+        stats = {
+            "load_duration": 0,
+            "prompt_eval_duration": int(prompt_latency * 1e9),
+            "eval_count": len(pieces),
+            "eval_duration": int(token_latency * len(pieces) * 1e9),
+        }
+        evaluated = prompt_eval_count(model, words)
+        if evaluated:
+            # Like Ollama, leave the count out when the whole prompt was cached
+            stats["prompt_eval_count"] = evaluated
+
+        def message(text, done, **extra):
+            return {"model": model, "created_at": _timestamp(), **frame(text), "done": done, **extra}
+
+        if not streaming:
+            await asyncio.sleep(prompt_latency + token_latency * len(pieces))
+            return JSONResponse(message("".join(pieces), True, **stats))
+
+        async def stream():
+            if prompt_latency:
+                await asyncio.sleep(prompt_latency)
+            for i, piece in enumerate(pieces):
+                if fail and i == len(pieces) // 2:
+                    raise ConnectionAbortedError("injected failure")
+                if token_latency:
+                    await asyncio.sleep(token_latency)
+                yield json.dumps(message(piece, False)) + "\n"
+            yield json.dumps(message("", True, **stats)) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    # langchain's Ollama LLM posts to "/api/generate/" with the trailing slash
+    @app.post("/api/generate")
+    @app.post("/api/generate/")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        return await generation(body, prompt, prompt.split(), lambda text: {"response": text})
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        prompt = "\n".join(f"{message.get('role', '')}: {message.get('content', '')}" for message in messages)
+        return await generation(
+            body, prompt, prompt.split(), lambda text: {"message": {"role": "assistant", "content": text}}
+        )
+
+    return app
+
+
+def add_server_arguments(parser):
+    """Generation, latency and failure options shared by every script that starts a fake Ollama."""
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per generation")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds before each generated token")
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="Seconds before the first generated token")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embeddings request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of generations that fail")
+    parser.add_argument("--failure-mode", choices=("status", "disconnect"), default="status")
+    parser.add_argument("--embedding-failure-rate", type=float, default=0.0, help="Fraction of embeddings requests that fail")
+    parser.add_argument("--failure-seed", type=int, default=0)
+
+
+def server_options(args):
+    return {
+        "tokens": args.tokens,
+        "token_latency": args.token_latency,
+        "prompt_latency": args.prompt_latency,
+        "embedding_latency": args.embedding_latency,
+        "failure_rate": args.failure_rate,
+        "failure_mode": args.failure_mode,
+        "embedding_failure_rate": args.embedding_failure_rate,
+        "seed": args.failure_seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Embedding width")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(dim=args.dim, **server_options(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Load generator for /chat/stream that replays a JSONL traffic file.
+
+Each line of ``--traffic`` is one request. A line with ``text`` is sent as the
+request body; a line with ``messages`` is wrapped in ``{"text": ...}``. Any
+other line becomes one user message from its ``content`` or ``query`` field,
+or from ``title`` and ``body``, so a backlog file such as ``requests.jsonl``
+can be replayed as is. Lines are sent in order and repeated as needed.
+
+For each concurrency level the script keeps that many streams open until
+``--requests`` have finished. It reports time to first token (TTFT), total
+latency, requests and tokens per second (estimated from the answer length the
+same way the API estimates prompt sizes), and failures. By default it starts
+the fake Ollama and the API in-process. ``--url`` targets an API that is
+already running instead.
+
+    python -m benchmarks.load_chat --concurrency 1,4,16 --requests 200 --token-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import httpx
+from .bench_chat import add_stack_arguments, chat_stack
+from .common import app_module, latency_summary, write_results
+
+DEFAULT_TRAFFIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic.jsonl")
+
+
+def request_body(record):
+    if "text" in record:
+        return {"text": record["text"]}
+    if "messages" in record:
+        return {"text": {"messages": record["messages"]}}
+    content = record.get("content") or record.get("query")
+    if content is None:
+        content = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+    if not content:
+        raise ValueError(f"Traffic line has no text, messages, content, query, title or body: {record}")
+    return {"text": {"messages": [{"role": "user", "content": content}]}}
+
+
+def load_traffic(path):
+    with open(path) as f:
+        bodies = [request_body(json.loads(line)) for line in f if line.strip()]
+    if not bodies:
+        raise ValueError(f"No requests in {path}")
+    return bodies
+
+
+async def stream_request(client, body):
+    """One /chat/stream call; ``ok`` means the stream ended with ``finish_reason`` rather than the error event."""
+    started = time.perf_counter()
+    sample = {"first_token": None, "events": 0, "answer": [], "ok": False, "error": None}
+    try:
+        async with client.stream("POST", "/chat/stream", json=body) as response:
+            if response.status_code != 200:
+                sample["error"] = f"HTTP {response.status_code}"
+                await response.aread()
+            else:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: ") or line == "data: [DONE]":
+                        continue
+                    choice = json.loads(line[len("data: "):])["choices"][0]
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        if sample["first_token"] is None:
+                            sample["first_token"] = time.perf_counter() - started
+                        sample["events"] += 1
+                        sample["answer"].append(content)
+                    if choice.get("finish_reason") == "stop":
+                        sample["ok"] = True
+                if not sample["ok"]:
+                    sample["error"] = "error event"
+    except httpx.HTTPError as e:
+        sample["error"] = type(e).__name__
+    sample["total"] = time.perf_counter() - started
+    return sample
+
+
+async def run_level(base_url, bodies, requests, concurrency, timeout):
+    """Closed loop: ``concurrency`` workers take the next traffic line until ``requests`` were sent."""
+    next_request = iter(range(requests))
+    samples = []
+
+    async def worker(client):
+        for i in next_request:
+            samples.append(await stream_request(client, bodies[i % len(bodies)]))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    estimate_tokens = app_module("src.context_packer").estimate_tokens
+    succeeded = [sample for sample in samples if sample["ok"]]
+    errors = {}
+    for sample in samples:
+        if sample["error"] is not None:
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "requests_per_s": len(succeeded) / elapsed,
+        "tokens_per_s": sum(estimate_tokens("".join(sample["answer"])) for sample in succeeded) / elapsed,
+        "events_per_request": sum(sample["events"] for sample in succeeded) / len(succeeded) if succeeded else 0,
+        "first_token": latency_summary([sample["first_token"] for sample in succeeded]),
+        "latency": latency_summary([sample["total"] for sample in succeeded]),
+    }
+
+
+def report(result):
+    ttft = result["first_token"]
+    line = f"concurrency {result['concurrency']:>3}: {result['requests_per_s']:.1f} req/s, {result['tokens_per_s']:.0f} tokens/s"
+    if ttft["count"]:
+        line += f", TTFT p50 {ttft['p50_ms']:.1f}ms p95 {ttft['p95_ms']:.1f}ms p99 {ttft['p99_ms']:.1f}ms"
+    if result["errors"]:
+        line += f", errors {result['errors']}"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="JSONL file of requests to replay")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds per request")
+    parser.add_argument("--url", default=None, help="Running API to target instead of starting one with the fake Ollama")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/load-<time>.json)")
+    add_stack_arguments(parser)
+    args = parser.parse_args(argv)
+
+    bodies = load_traffic(args.traffic)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    def run(base_url):
+        results = []
+        for concurrency in levels:
+            result = asyncio.run(run_level(base_url, bodies, args.requests, concurrency, args.timeout))
+            report(result)
+            results.append(result)
+        return results
+
+    if args.url:
+        results = {"levels": run(args.url.rstrip("/"))}
+    else:
+        with chat_stack(args) as (base_url, startup_s):
+            results = {"startup_s": startup_s, "levels": run(base_url)}
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results("load", config, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
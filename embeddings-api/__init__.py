@@ -2,9 +2,23 @@ from fastapi import FastAPI
 from .post_embeddings import embeddings_api
 from .post_conversation_summary import conversation_summary_api
 from .post_chat import chat_api
+from .get_metrics import metrics_api
+from .get_health import health_api
+from .src.services import Services
 
 app = FastAPI(title="Embeddings API", description="Local OLLAMA-powered embeddings and chat API")
 
 app.include_router(conversation_summary_api)
 app.include_router(embeddings_api)
-app.include_router(chat_api)
\ No newline at end of file
+app.include_router(chat_api)
+app.include_router(metrics_api)
+app.include_router(health_api)
+
+@app.on_event("startup")
+async def startup():
+    # The store loads in the background; GET /ready reports when it is searchable
+    await Services().start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await Services().stop()
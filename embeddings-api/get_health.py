@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from .src.services import Services
+
+health_api = APIRouter()
+
+@health_api.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@health_api.get("/ready")
+async def ready():
+    """Readiness: 200 once the embeddings store can be searched, 503 while it loads or if loading failed"""
+    vector_search_api = Services().vector_search_api
+    body = {
+        "status": vector_search_api.status,
+        "documents": len(vector_search_api.db) if vector_search_api.ready else 0,
+        "reindexing": vector_search_api.reindexing,
+        "index_version": vector_search_api.index_version,
+    }
+    if vector_search_api.load_error is not None and not vector_search_api.ready:
+        body["error"] = str(vector_search_api.load_error)
+    return JSONResponse(body, status_code=200 if vector_search_api.ready else 503)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from .src.lib.metrics import CONTENT_TYPE, REGISTRY
+
+metrics_api = APIRouter()
+
+@metrics_api.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of latency histograms, token and chunk counters and cache gauges"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -1,95 +1,70 @@
-import json
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
-from .src.vector_search_api import VectorSearchAPI
-from .src.summarizer import Summarizer
-from .src.chat_completion import ChatCompletion
+from .src.services import Services
 from .src.global_config import GlobalConfig
+from .src.event_stream import HEADERS, sse_event
+from .src.lib.response_cache import prompt_key, semantic_scope
+from .src.lib.metrics import stage_timer
 
 chat_api = APIRouter()
-vector_search_api = VectorSearchAPI()
-conversation_summarizer = Summarizer()
-chat_completion = ChatCompletion()
 config = GlobalConfig
 
+async def prepare_chat(query):
+    """Returns ``(messages, cached_answer, remember)``; ``remember`` stores a newly generated answer"""
+    services = Services()
+    prompt_pipeline = services.prompt_pipeline
+    response_cache = services.response_cache
+    vector_search_api = services.vector_search_api
+    if response_cache is None:
+        return await prompt_pipeline.build_messages(query), None, None
+    response_cache.sync(vector_search_api.index_version)
+    model = config().ollama_chat_model
+
+    scope = query_vector = None
+    conversation, retrieve_embeddings, include_history_summary, filter = prompt_pipeline.parse_request(query)
+    user_turns = [i for i, message in enumerate(conversation) if message["role"] == "user"]
+    if response_cache.semantic_threshold and user_turns:
+        # Embed the question once: it is matched against cached questions and reused for retrieval
+        conversation = conversation[:user_turns[-1] + 1]
+        scope = semantic_scope(model, conversation, retrieve_embeddings, include_history_summary, filter)
+        query_vector = await vector_search_api.aembed_query(conversation[-1])
+        if query_vector is None:
+            # Without a vector the question can neither match cached questions nor be matched later
+            scope = None
+        else:
+            cached_answer = response_cache.get_similar(scope, query_vector)
+            if cached_answer is not None:
+                return None, cached_answer, None
+
+    skipped_stages = []
+    messages = await prompt_pipeline.build_messages(query, query_vector=query_vector, skipped_stages=skipped_stages)
+    key = prompt_key(model, messages)
+    cached_answer = response_cache.get(key)
+    if cached_answer is not None:
+        return messages, cached_answer, None
+    if skipped_stages:
+        # An answer generated without its summary or context must not be served to later questions
+        return messages, None, None
+    return messages, None, lambda answer: response_cache.put(key, answer, scope, query_vector)
+
 @chat_api.post("/chat/stream")
 async def chat_stream(request: Request):
     """Streaming chat endpoint"""
     try:
-        query = await request.json()
-        
-        # Parse the request
-        if isinstance(query["text"], str):
-            # Legacy format support
-            parsed_data = json.loads(query["text"])
-            conversation = parsed_data["messages"]
-            retrieve_embeddings = True  # Default behavior
-            include_history_summary = True  # Default behavior
+        with stage_timer("parse"):
+            query = await request.json()
+        messages, cached_answer, remember = await prepare_chat(query)
+        chat_completion = Services().chat_completion
+        if cached_answer is not None:
+            stream = chat_completion.replay_stream(cached_answer)
         else:
-            # New format with flags
-            conversation = query["text"]["messages"]
-            retrieve_embeddings = query["text"].get("retrieve_embeddings", True)
-            include_history_summary = query["text"].get("include_history_summary", True)
-        
-        # Extract conversation components
-        system_messages = [msg for msg in conversation if msg["role"] == "system"]
-        user_messages = [msg for msg in conversation if msg["role"] == "user"]
-        assistant_messages = [msg for msg in conversation if msg["role"] == "assistant"]
-        
-        # Get the last user prompt
-        last_user_prompt = user_messages[-1] if user_messages else {"role": "user", "content": ""}
-        
-        # Build conversation history (excluding the last user message)
-        conversation_history = []
-        for i in range(len(conversation) - 1):  # Exclude last message
-            if conversation[i]["role"] in ["user", "assistant"]:
-                conversation_history.append(conversation[i])
-        
-        messages = []
-        
-        # Add system message
-        if system_messages:
-            messages.append(system_messages[0])
-        else:
-            messages.append({
-                "role": "system", 
-                "content": "You are a helpful AI assistant. Use any provided context to answer questions accurately and remember details from the conversation."
-            })
-        
-        # Add conversation summary if enabled and history exists
-        if include_history_summary and conversation_history:
-            summarized_conversation = conversation_summarizer.summarize(conversation_history)
-            messages.append({
-                "role": "user", 
-                "content": f"Previous conversation summary: {summarized_conversation}"
-            })
-
-        # Add document embeddings if enabled
-        if retrieve_embeddings:
-            embeddings = vector_search_api.get_embeddings(last_user_prompt)
-            if embeddings:
-                combined_context = "\n\n".join(embeddings)
-                messages.append({
-                    "role": "user", 
-                    "content": f"Document context: {combined_context}"
-                })
-        
-        # Add the current user prompt
-        messages.append(last_user_prompt)
+            stream = chat_completion.achat_stream(messages, on_complete=remember)
 
         # Return streaming response
-        return StreamingResponse(
-            chat_completion.chat_stream(messages),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-            }
-        )
+        return StreamingResponse(stream, media_type="text/event-stream", headers=HEADERS)
     except Exception as e:
         print(f'Error in streaming chat endpoint: {e}')
-        def error_stream():
+        async def error_stream():
             error_chunk = {
                 "choices": [{
                     "delta": {
@@ -97,79 +72,22 @@ async def chat_stream(request: Request):
                     }
                 }]
             }
-            yield f"data: {json.dumps(error_chunk)}\n\n"
-            yield "data: [DONE]\n\n"
+            yield sse_event(error_chunk)
+            yield sse_event("[DONE]")
         
-        return StreamingResponse(
-            error_stream(),
-            media_type="text/plain"
-        )
+        return StreamingResponse(error_stream(), media_type="text/event-stream", headers=HEADERS)
 
 @chat_api.post("/chat")
 async def chat(request: Request):
     try:
-        query = await request.json()
-        
-        # Parse the request
-        if isinstance(query["text"], str):
-            # Legacy format support
-            parsed_data = json.loads(query["text"])
-            conversation = parsed_data["messages"]
-            retrieve_embeddings = True  # Default behavior
-            include_history_summary = True  # Default behavior
-        else:
-            # New format with flags
-            conversation = query["text"]["messages"]
-            retrieve_embeddings = query["text"].get("retrieve_embeddings", True)
-            include_history_summary = query["text"].get("include_history_summary", True)
-        
-        # Extract conversation components
-        system_messages = [msg for msg in conversation if msg["role"] == "system"]
-        user_messages = [msg for msg in conversation if msg["role"] == "user"]
-        assistant_messages = [msg for msg in conversation if msg["role"] == "assistant"]
-        
-        # Get the last user prompt
-        last_user_prompt = user_messages[-1] if user_messages else {"role": "user", "content": ""}
-        
-        # Build conversation history (excluding the last user message)
-        conversation_history = []
-        for i in range(len(conversation) - 1):  # Exclude last message
-            if conversation[i]["role"] in ["user", "assistant"]:
-                conversation_history.append(conversation[i])
-        
-        messages = []
-        
-        # Add system message
-        if system_messages:
-            messages.append(system_messages[0])
-        else:
-            messages.append({
-                "role": "system", 
-                "content": "You are a helpful AI assistant. Use any provided context to answer questions accurately and remember details from the conversation."
-            })
-        
-        # Add conversation summary if enabled and history exists
-        if include_history_summary and conversation_history:
-            summarized_conversation = conversation_summarizer.summarize(conversation_history)
-            messages.append({
-                "role": "user", 
-                "content": f"Previous conversation summary: {summarized_conversation}"
-            })
-
-        # Add document embeddings if enabled
-        if retrieve_embeddings:
-            embeddings = vector_search_api.get_embeddings(last_user_prompt)
-            if embeddings:
-                combined_context = "\n\n".join(embeddings)
-                messages.append({
-                    "role": "user", 
-                    "content": f"Document context: {combined_context}"
-                })
-        
-        # Add the current user prompt
-        messages.append(last_user_prompt)
+        with stage_timer("parse"):
+            query = await request.json()
+        messages, cached_answer, remember = await prepare_chat(query)
+        chat_completion = Services().chat_completion
+        if cached_answer is not None:
+            return chat_completion.replay(cached_answer)
 
-        response = chat_completion.chat(messages)
+        response = await chat_completion.achat(messages, on_complete=remember)
         return response
     except Exception as e:
         print(f'Error in chat endpoint: {e}')
@@ -1,6 +1,6 @@
 import json
 from fastapi import APIRouter, Request
-from .src.summarizer import Summarizer
+from .src.services import Services
 
 class Response:
     def __init__(self, result: bool, messages: list, status_code: int, exception: str = None):
@@ -10,7 +10,6 @@ class Response:
         self.exception = exception
 
 conversation_summary_api = APIRouter()
-conversation_summarizer = Summarizer()
 
 @conversation_summary_api.post("/conversation-summary")
 async def conversation_summary(request: Request):
@@ -23,7 +22,7 @@ async def conversation_summary(request: Request):
         openai_data = []
         openai_data.append(assistant_role)
         if conversation_history: 
-            summarized_conversation = conversation_summarizer.summarize(conversation_history)
+            summarized_conversation = await Services().summarizer.asummarize(conversation_history)
             openai_data.append({"role": "user", "content": summarized_conversation})
         openai_data.append(last_user_prompt)
         return Response(result=True, messages=openai_data, status_code=200)
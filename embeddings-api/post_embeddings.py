@@ -1,7 +1,10 @@
 import os
 import json
 from fastapi import APIRouter, Request
-from .src.vector_search_api import VectorSearchAPI
+from starlette.concurrency import run_in_threadpool
+from .src.services import Services
+from .src.vector_search_api import IndexNotReadyError
+from .src.lib.hyperdb import get_embedding_cache
 
 class Response:
     def __init__(self, result: bool, messages: list, status_code: int, exception: str = None):
@@ -11,7 +14,6 @@ class Response:
         self.exception = exception
 
 embeddings_api = APIRouter()
-vector_search_api = VectorSearchAPI()
 
 @embeddings_api.post("/embeddings")
 async def embeddings(request: Request):
@@ -19,11 +21,46 @@ async def embeddings(request: Request):
         query = await request.json()
         conversation = json.loads(query["text"])["messages"]
         last_user_prompt = [message for message in conversation if message["role"] == "user"][-1]
-        embeddings = vector_search_api.get_embeddings(last_user_prompt)
+        embeddings = await Services().vector_search_api.aget_embeddings(last_user_prompt)
         openai_data = []
         for embedding in embeddings:
             openai_data.append({"role": "user", "content": embedding})
         openai_data.append(last_user_prompt)
         return Response(result=True, messages=openai_data, status_code=200)
+    except IndexNotReadyError as e:
+        return Response(result=False, messages=None, status_code=503, exception=str(e))
     except Exception as e:
-        return Response(result=False, messages=None, status_code=500, exception=str(e))
\ No newline at end of file
+        return Response(result=False, messages=None, status_code=500, exception=str(e))
+
+@embeddings_api.post("/search/batch")
+async def search_batch(request: Request):
+    try:
+        query = await request.json()
+        results = await run_in_threadpool(
+            Services().vector_search_api.search_batch,
+            query["queries"],
+            top_k=query.get("top_k", 5),
+            filter=query.get("filter"),
+            mode=query.get("mode"),
+        )
+        return Response(result=True, messages=results, status_code=200)
+    except IndexNotReadyError as e:
+        return Response(result=False, messages=None, status_code=503, exception=str(e))
+    except Exception as e:
+        return Response(result=False, messages=None, status_code=500, exception=str(e))
+
+@embeddings_api.post("/reindex")
+async def reindex():
+    try:
+        # Waits for a startup load still in progress, then indexes anything changed since
+        stats = await run_in_threadpool(Services().vector_search_api.reindex)
+        return Response(result=True, messages=[stats], status_code=200)
+    except Exception as e:
+        return Response(result=False, messages=None, status_code=500, exception=str(e))
+
+@embeddings_api.get("/embeddings/cache")
+async def embeddings_cache():
+    cache = get_embedding_cache()
+    if cache is None:
+        return Response(result=False, messages=None, status_code=404, exception="Embedding cache is disabled")
+    return Response(result=True, messages=[await run_in_threadpool(cache.stats)], status_code=200)
@@ -1,98 +1,221 @@
-from langchain_community.llms import Ollama
 from .global_config import GlobalConfig
-import json
+from .context_packer import estimate_tokens
+from .event_stream import HEARTBEAT, coalesce, sse_event
+from .ollama_clients import get_chat_client
+from .lib.metrics import CHAT_STREAMS, CHAT_TOKENS, OLLAMA_SECONDS, STAGE_SECONDS
+import asyncio
+import time
 
 config = GlobalConfig()
 
+# Ollama reports durations in nanoseconds
+NANOSECONDS = 1e9
+
 class ChatCompletion:
+    """Chat completions through Ollama's chat endpoint
+
+    Messages keep their roles, so the model's own chat template builds the
+    prompt, and every request carries OLLAMA_KEEP_ALIVE so the model (and the
+    KV cache of the prompt prefix it just evaluated) stays loaded between turns.
+    """
+
     def __init__(self):
-        self.llm = Ollama(
-            model=config.ollama_chat_model,
-            base_url=config.ollama_base_url,
-            temperature=0.7
-        )
+        self.client = get_chat_client()
+        self.model = config.ollama_chat_model
+        self.options = {"temperature": 0.7}
 
     def chat_stream(self, messages):
         """Stream chat completion responses"""
         try:
-            # Convert messages to a single prompt for Ollama
-            prompt = self._messages_to_prompt(messages)
-            
-            # Stream the response
-            for chunk in self.llm.stream(prompt):
-                # Format each chunk in a streaming format
-                chunk_data = {
-                    "choices": [{
-                        "delta": {
-                            "content": chunk
-                        }
-                    }]
-                }
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-                
+            stats = {}
+            stream = self.client.client.chat(**self._request(messages, stream=True))
+            for part in stream:
+                if part.get("done"):
+                    stats = part
+                content = part.get("message", {}).get("content")
+                if content:
+                    yield self._delta_event(content)
+
             # Send final chunk to indicate completion
-            final_chunk = {
-                "choices": [{
-                    "delta": {},
-                    "finish_reason": "stop"
-                }]
-            }
-            yield f"data: {json.dumps(final_chunk)}\n\n"
-            yield "data: [DONE]\n\n"
-            
+            yield from self._final_events(self._usage(stats))
+
+        except Exception as e:
+            print(f"Error in chat completion: {e}")
+            yield from self._error_events()
+
+    async def achat_stream(self, messages, on_complete=None):
+        """Async chat_stream: reads Ollama's stream without tying up a threadpool worker per client
+
+        Tokens arriving within STREAM_FLUSH_INTERVAL of the last frame are sent
+        together, and a heartbeat comment goes out after STREAM_HEARTBEAT_INTERVAL
+        of silence. If the client disconnects the Ollama request is closed, which
+        stops the generation. ``on_complete`` is called with the full answer once
+        the stream finished without errors.
+        """
+        frames = None
+        try:
+            started = time.perf_counter()
+            chunks = []
+            stats = {}
+            frames = coalesce(
+                self._astream_content(messages, stats), config.stream_flush_interval, config.stream_heartbeat_interval
+            )
+            async for text in frames:
+                if text is None:
+                    yield HEARTBEAT
+                    continue
+                if not chunks:
+                    STAGE_SECONDS.labels("first_token").observe(time.perf_counter() - started)
+                chunks.append(text)
+                yield self._delta_event(text)
+            response = "".join(chunks)
+            self._observe_generation(messages, response, stats, started)
+            if on_complete is not None:
+                on_complete(response)
+
+            for event in self._final_events(self._usage(stats)):
+                yield event
+            CHAT_STREAMS.labels("completed").inc()
+
+        except (asyncio.CancelledError, GeneratorExit):
+            CHAT_STREAMS.labels("cancelled").inc()
+            raise
         except Exception as e:
             print(f"Error in chat completion: {e}")
-            error_chunk = {
-                "choices": [{
-                    "delta": {
-                        "content": "I apologize, but I encountered an error processing your request."
-                    }
-                }]
-            }
-            yield f"data: {json.dumps(error_chunk)}\n\n"
-            yield "data: [DONE]\n\n"
+            CHAT_STREAMS.labels("failed").inc()
+            for event in self._error_events():
+                yield event
+        finally:
+            # Close the upstream request now rather than whenever the generator is collected
+            if frames is not None:
+                await frames.aclose()
 
     def chat(self, messages):
         """Non-streaming chat completion for backward compatibility"""
         try:
-            # Convert messages to a single prompt for Ollama
-            prompt = self._messages_to_prompt(messages)
-            response = self.llm.invoke(prompt)
-            
-            # Return in OpenAI-compatible format for existing code
-            return {
-                "choices": [{
-                    "message": {
-                        "role": "assistant",
-                        "content": response
-                    }
-                }]
-            }
+            result = self.client.client.chat(**self._request(messages))
+            return self._completion(result["message"]["content"], self._usage(result))
         except Exception as e:
             print(f"Error in chat completion: {e}")
-            return {
-                "choices": [{
-                    "message": {
-                        "role": "assistant",
-                        "content": "I apologize, but I encountered an error processing your request."
-                    }
-                }]
-            }
-
-    def _messages_to_prompt(self, messages):
-        """Convert OpenAI-style messages to a single prompt for Ollama"""
-        prompt_parts = []
-        
-        for message in messages:
-            role = message.get("role", "")
-            content = message.get("content", "")
-            
-            if role == "system":
-                prompt_parts.append(f"System: {content}")
-            elif role == "user":
-                prompt_parts.append(f"User: {content}")
-            elif role == "assistant":
-                prompt_parts.append(f"Assistant: {content}")
-        
-        prompt_parts.append("Assistant:")
-        return "\n\n".join(prompt_parts)
\ No newline at end of file
+            return self._completion("I apologize, but I encountered an error processing your request.")
+
+    async def achat(self, messages, on_complete=None):
+        """Async non-streaming chat completion; ``on_complete`` receives the answer unless it failed"""
+        try:
+            started = time.perf_counter()
+            result = await self.client.async_client().chat(**self._request(messages))
+            response = result["message"]["content"]
+            self._observe_generation(messages, response, result, started)
+            if on_complete is not None:
+                on_complete(response)
+            return self._completion(response, self._usage(result))
+        except Exception as e:
+            print(f"Error in chat completion: {e}")
+            return self._completion("I apologize, but I encountered an error processing your request.")
+
+    async def replay_stream(self, content):
+        """Stream a cached answer with the same framing as a generated one"""
+        yield self._delta_event(content)
+        for event in self._final_events():
+            yield event
+
+    def replay(self, content):
+        """Non-streaming response for a cached answer"""
+        return self._completion(content)
+
+    async def _astream_content(self, messages, stats):
+        """Yield the answer's text pieces; ``stats`` receives Ollama's final message with its counts and durations"""
+        stream = await self.client.async_client().chat(**self._request(messages, stream=True))
+        try:
+            async for part in stream:
+                if part.get("done"):
+                    stats.update(part)
+                yield part.get("message", {}).get("content", "")
+        finally:
+            await stream.aclose()
+
+    def _request(self, messages, stream=False):
+        return {
+            "model": self.model,
+            "messages": self._chat_messages(messages),
+            "stream": stream,
+            "options": self.options,
+            "keep_alive": config.ollama_keep_alive,
+        }
+
+    def _chat_messages(self, messages):
+        """Copy only role and content; Ollama rejects messages with empty content"""
+        return [
+            {"role": message["role"], "content": message["content"]}
+            for message in messages
+            if message.get("role") in ("system", "user", "assistant") and message.get("content")
+        ]
+
+    def _observe_generation(self, messages, response, stats, started):
+        STAGE_SECONDS.labels("generation").observe(time.perf_counter() - started)
+        if stats.get("done"):
+            # Ollama leaves prompt_eval_count out when the whole prompt came from its cache
+            CHAT_TOKENS.labels("prompt").inc(stats.get("prompt_eval_count", 0))
+            CHAT_TOKENS.labels("completion").inc(stats.get("eval_count", 0))
+            for phase in ("load", "prompt_eval", "eval"):
+                if f"{phase}_duration" in stats:
+                    OLLAMA_SECONDS.labels(phase).observe(stats[f"{phase}_duration"] / NANOSECONDS)
+        else:
+            CHAT_TOKENS.labels("prompt").inc(sum(estimate_tokens(message.get("content", "")) for message in messages))
+            CHAT_TOKENS.labels("completion").inc(estimate_tokens(response))
+
+    def _usage(self, stats):
+        """OpenAI-style usage from Ollama's final message, with its prompt and generation durations in seconds"""
+        if not stats.get("done"):
+            return None
+        prompt_tokens = stats.get("prompt_eval_count", 0)
+        completion_tokens = stats.get("eval_count", 0)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "load_seconds": stats.get("load_duration", 0) / NANOSECONDS,
+            "prompt_eval_seconds": stats.get("prompt_eval_duration", 0) / NANOSECONDS,
+            "eval_seconds": stats.get("eval_duration", 0) / NANOSECONDS,
+        }
+
+    def _completion(self, content, usage=None):
+        # Return in OpenAI-compatible format for existing code
+        completion = {
+            "choices": [{
+                "message": {
+                    "role": "assistant",
+                    "content": content
+                }
+            }]
+        }
+        if usage is not None:
+            completion["usage"] = usage
+        return completion
+
+    def _delta_event(self, content):
+        # Format each chunk in a streaming format
+        chunk_data = {
+            "choices": [{
+                "delta": {
+                    "content": content
+                }
+            }]
+        }
+        return sse_event(chunk_data)
+
+    def _final_events(self, usage=None):
+        final_chunk = {
+            "choices": [{
+                "delta": {},
+                "finish_reason": "stop"
+            }]
+        }
+        if usage is not None:
+            final_chunk["usage"] = usage
+        yield sse_event(final_chunk)
+        yield sse_event("[DONE]")
+
+    def _error_events(self):
+        yield self._delta_event("I apologize, but I encountered an error processing your request.")
+        yield sse_event("[DONE]")
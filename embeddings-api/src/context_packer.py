@@ -0,0 +1,114 @@
+import logging
+from .global_config import GlobalConfig
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text with Llama-style tokenizers
+CHARS_PER_TOKEN = 4
+# Shortest shared run of text treated as the splitter's chunk overlap
+MIN_OVERLAP_CHARS = 20
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _merge_overlap(first, second):
+    """Return ``first`` extended by ``second`` if the tail of ``first`` is the head of ``second``, else None"""
+    if second in first:
+        return first
+    head = second[:MIN_OVERLAP_CHARS]
+    position = first.find(head, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first[:position] + second
+        position = first.find(head, position + 1)
+    return None
+
+class ContextPacker:
+    """Turns ranked search results into a deduplicated document context that fits a token budget"""
+
+    def __init__(self, token_budget=None, min_similarity=None):
+        config = GlobalConfig()
+        self.token_budget = config.context_token_budget if token_budget is None else token_budget
+        self.min_similarity = config.context_min_similarity if min_similarity is None else min_similarity
+
+    def pack(self, results, mode="vector"):
+        """Returns ``(contexts, stats)`` for ``(document, similarity)`` results ordered best first
+
+        ``min_similarity`` is a cosine cutoff, so it only applies to results of the
+        ``vector`` search mode; BM25 and fused hybrid scores are on other scales.
+        """
+        chunks = [self._chunk(result) for result in results]
+        raw_tokens = sum(estimate_tokens(chunk["text"]) for chunk in chunks)
+
+        if mode == "vector":
+            kept = [chunk for chunk in chunks if chunk["similarity"] is None or chunk["similarity"] >= self.min_similarity]
+        else:
+            kept = chunks
+        blocks = self._merge_neighbours(kept)
+
+        contexts, packed_tokens = [], 0
+        for block in sorted(blocks, key=lambda block: block["rank"]):
+            tokens = estimate_tokens(block["text"])
+            if packed_tokens + tokens > self.token_budget:
+                if not contexts:
+                    # Never return an empty context just because the best block is oversized
+                    contexts.append(block["text"][:self.token_budget * CHARS_PER_TOKEN])
+                    packed_tokens = self.token_budget
+                continue
+            contexts.append(block["text"])
+            packed_tokens += tokens
+
+        stats = {
+            "retrieved_chunks": len(chunks),
+            "kept_chunks": len(kept),
+            "blocks": len(contexts),
+            "retrieved_tokens": raw_tokens,
+            "context_tokens": packed_tokens,
+            "tokens_saved": raw_tokens - packed_tokens,
+        }
+        logger.info(
+            f"Packed {stats['retrieved_chunks']} chunks into {stats['blocks']} context blocks: "
+            f"{raw_tokens} -> {packed_tokens} tokens (saved {stats['tokens_saved']})"
+        )
+        return contexts, stats
+
+    def _chunk(self, result):
+        document, similarity = result if isinstance(result, tuple) else (result, None)
+        if isinstance(document, dict):
+            text = document.get("description", str(document))
+            source = document.get("source")
+        else:
+            text, source = str(document), None
+        return {
+            "text": text,
+            "source": source,
+            "similarity": None if similarity is None else float(similarity),
+        }
+
+    def _merge_neighbours(self, chunks):
+        """Drop repeated chunks and stitch together neighbouring chunks of the same source"""
+        blocks = []
+        by_source = {}
+        seen = set()
+        for rank, chunk in enumerate(chunks):
+            if chunk["text"] in seen:
+                continue
+            seen.add(chunk["text"])
+            block = {"text": chunk["text"], "rank": rank}
+            siblings = by_source.setdefault(chunk["source"], []) if chunk["source"] is not None else []
+            # Keep absorbing neighbours: a new chunk can bridge two blocks found earlier
+            merged = True
+            while merged:
+                merged = False
+                for sibling in siblings:
+                    text = _merge_overlap(sibling["text"], block["text"]) or _merge_overlap(block["text"], sibling["text"])
+                    if text is not None:
+                        siblings[:] = [other for other in siblings if other is not sibling]
+                        blocks = [other for other in blocks if other is not sibling]
+                        block = {"text": text, "rank": min(rank, sibling["rank"])}
+                        rank = block["rank"]
+                        merged = True
+                        break
+            siblings.append(block)
+            blocks.append(block)
+        return blocks
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import math
+
+# SSE comment line: keeps proxies and load balancers from timing out an idle stream, ignored by clients
+HEARTBEAT = ": keep-alive\n\n"
+HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    # Stops nginx from buffering the stream until it ends
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data):
+    """One ``text/event-stream`` frame carrying ``data`` as JSON (strings are sent verbatim)"""
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    return f"data: {data}\n\n"
+
+
+async def coalesce(chunks, flush_interval=0.0, heartbeat_interval=0.0):
+    """Regroup an async iterator of text chunks into frames
+
+    Yields the text gathered since the previous frame, at most once every
+    ``flush_interval`` seconds (the first chunk goes out at once), and None
+    when nothing was yielded for ``heartbeat_interval`` seconds (0 disables
+    heartbeats). Only one chunk is read ahead, so a slow client slows the
+    upstream read instead of growing a buffer. Closing or cancelling the
+    generator, as Starlette does when the client disconnects, cancels the
+    pending read and closes ``chunks``, which drops the upstream request.
+    """
+    iterator = chunks.__aiter__()
+    loop = asyncio.get_running_loop()
+    pending = []
+    next_chunk = None
+    last_flush = -math.inf
+    last_sent = loop.time()
+    exhausted = False
+    try:
+        while not exhausted:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+            deadlines = []
+            if pending:
+                deadlines.append(last_flush + flush_interval)
+            if heartbeat_interval > 0:
+                deadlines.append(last_sent + heartbeat_interval)
+            timeout = max(0.0, min(deadlines) - loop.time()) if deadlines else None
+
+            done, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+            if done:
+                task, next_chunk = next_chunk, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    if chunk:
+                        pending.append(chunk)
+
+            now = loop.time()
+            if pending and (exhausted or now - last_flush >= flush_interval):
+                yield "".join(pending)
+                pending = []
+                last_flush = last_sent = loop.time()
+            elif heartbeat_interval > 0 and now - last_sent >= heartbeat_interval:
+                yield None
+                last_sent = loop.time()
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+            await asyncio.gather(next_chunk, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -7,9 +7,42 @@ class Singleton(type):
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
 
+def _duration(value):
+    """Ollama reads bare numbers as seconds and strings such as ``30m`` as durations"""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
 class GlobalConfig(metaclass=Singleton):
     def __init__(self):
         self.ollama_base_url = os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434")
         self.ollama_chat_model = os.environ.get("OLLAMA_CHAT_MODEL", "llama2")
         self.ollama_embeddings_model = os.environ.get("OLLAMA_EMBEDDINGS_MODEL", "all-minilm")
-        self.embeddings_data_path = os.environ.get("EMBEDDINGS_DATA_PATH", "/app/data")
\ No newline at end of file
+        self.ollama_keep_alive = _duration(os.environ.get("OLLAMA_KEEP_ALIVE", "30m"))
+        self.embeddings_data_path = os.environ.get("EMBEDDINGS_DATA_PATH", "/app/data")
+        self.hyperdb_index = os.environ.get("HYPERDB_INDEX", "flat")
+        self.embedding_cache_path = os.environ.get("EMBEDDING_CACHE_PATH", "embeddings/embedding_cache.sqlite3")
+        self.embedding_cache_max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        self.embedding_concurrency = int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))
+        self.embedding_max_retries = int(os.environ.get("EMBEDDING_MAX_RETRIES", "3"))
+        self.embedding_retry_backoff = float(os.environ.get("EMBEDDING_RETRY_BACKOFF", "0.5"))
+        self.ingest_workers = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+        self.ingest_batch_size = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+        self.reindex_on_startup = os.environ.get("EMBEDDINGS_REINDEX_ON_STARTUP", "true").lower() == "true"
+        self.summary_timeout = float(os.environ.get("SUMMARY_TIMEOUT", "10"))
+        self.retrieval_timeout = float(os.environ.get("RETRIEVAL_TIMEOUT", "10"))
+        self.summary_cache_max_bytes = int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        self.summary_cache_ttl = float(os.environ.get("SUMMARY_CACHE_TTL", "3600"))
+        self.context_token_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+        self.context_min_similarity = float(os.environ.get("CONTEXT_MIN_SIMILARITY", "0.2"))
+        self.hyperdb_quantization = os.environ.get("HYPERDB_QUANTIZATION", "none")
+        self.hyperdb_rerank = os.environ.get("HYPERDB_RERANK", "true").lower() == "true"
+        self.hyperdb_search_mode = os.environ.get("HYPERDB_SEARCH_MODE", "vector")
+        self.hyperdb_shards = int(os.environ.get("HYPERDB_SHARDS", "1"))
+        self.hyperdb_search_threads = int(os.environ.get("HYPERDB_SEARCH_THREADS", "0"))
+        self.response_cache_max_entries = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        self.response_cache_ttl = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+        self.response_cache_semantic_threshold = float(os.environ.get("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0"))
+        self.stream_flush_interval = float(os.environ.get("STREAM_FLUSH_INTERVAL", "0.05"))
+        self.stream_heartbeat_interval = float(os.environ.get("STREAM_HEARTBEAT_INTERVAL", "15"))
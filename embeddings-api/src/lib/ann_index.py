@@ -0,0 +1,335 @@
+"""Approximate nearest-neighbour indexes for HyperDB.
+
+An index only narrows a query down to candidate rows; HyperDB still ranks the
+candidates with its configured similarity metric, so scores stay exact and the
+index only trades recall for speed. Both indexes work on cosine geometry.
+"""
+import heapq
+import numpy as np
+
+
+def _inverse_norms(vectors):
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    return (1.0 / norms).astype(np.float32)
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FlatIndex:
+    """Exhaustive search: every row is a candidate."""
+
+    name = "flat"
+
+    def __init__(self):
+        self.size = 0
+
+    def build(self, vectors):
+        self.size = len(vectors)
+
+    def reset(self):
+        self.size = 0
+
+    def search(self, vectors, query_vector, top_k, **kwargs):
+        return None
+
+    def params(self):
+        return {}
+
+    def arrays(self):
+        return {}
+
+    def restore(self, arrays, size):
+        self.size = size
+
+
+class IVFIndex:
+    """IVF-flat: rows are bucketed by spherical k-means and queries probe the closest buckets."""
+
+    name = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=20, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.centroids = None
+        self.list_ids = None
+        self.list_offsets = None
+
+    def build(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n == 0:
+            self.reset()
+            return
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        unit = vectors * _inverse_norms(vectors)[:, np.newaxis]
+
+        rng = np.random.default_rng(self.seed)
+        sample = unit[rng.choice(n, min(n, n_lists * 256), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignments = self._assign(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            filled = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+            # Re-seed empty buckets from random sample points
+            if not filled.all():
+                sums[~filled] = sample[rng.choice(len(sample), int((~filled).sum()))]
+            centroids = sums * _inverse_norms(sums)[:, np.newaxis]
+
+        assignments = self._assign(unit, centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]
+        ).astype(np.int64)
+        self.size = n
+
+    @staticmethod
+    def _assign(unit, centroids, block_size=65536):
+        assignments = np.empty(len(unit), dtype=np.int64)
+        for start in range(0, len(unit), block_size):
+            block = unit[start:start + block_size]
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def search(self, vectors, query_vector, top_k, n_probe=None, **kwargs):
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probe_order = np.argsort(-(self.centroids @ query_vector))
+        lists = []
+        found = 0
+        for rank, probe in enumerate(probe_order):
+            # Keep probing past n_probe if the buckets are too small to fill top_k
+            if rank >= n_probe and found >= top_k:
+                break
+            ids = self.list_ids[self.list_offsets[probe]:self.list_offsets[probe + 1]]
+            lists.append(ids)
+            found += len(ids)
+        return np.concatenate(lists)
+
+    def params(self):
+        return {"n_lists": self.n_lists, "n_probe": self.n_probe, "n_iter": self.n_iter, "seed": self.seed}
+
+    def arrays(self):
+        return {
+            "ivf_centroids": self.centroids,
+            "ivf_list_ids": self.list_ids,
+            "ivf_list_offsets": self.list_offsets,
+        }
+
+    def restore(self, arrays, size):
+        self.centroids = arrays["ivf_centroids"]
+        self.list_ids = arrays["ivf_list_ids"]
+        self.list_offsets = arrays["ivf_list_offsets"]
+        self.size = size
+
+
+class HNSWIndex:
+    """Hierarchical navigable small-world graph built with plain NumPy.
+
+    Instead of inserting rows one at a time, each layer is built as a k-nearest
+    neighbour graph over the rows on that layer: rows are bucketed with the
+    IVF k-means and every bucket is scored against its closest buckets with one
+    matrix product, then each row's links are its nearest rows plus the rows
+    that chose it. A quarter of every link list goes to random rows of the same
+    layer instead, so well separated clusters stay reachable from each other
+    (the incremental build got those long links from its early inserts).
+    Searches are the usual greedy descent through the layers.
+    """
+
+    name = "hnsw"
+    # Layers with at most this many rows are linked by exact all-pairs scoring
+    EXACT_ROWS = 4096
+    # Target rows per k-means bucket, and buckets each bucket is scored against
+    BUCKET_ROWS = 512
+    BUCKET_PROBES = 4
+
+    def __init__(self, m=16, ef_construction=100, ef_search=64, seed=0):
+        self.m = m
+        # Kept for stores written by the incremental build; the batched build does not use it
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self.inverse_norms = None
+        self.layers = []
+
+    def build(self, vectors):
+        n = len(vectors)
+        self.reset()
+        if n == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.inverse_norms = _inverse_norms(vectors)
+        unit = vectors * self.inverse_norms[:, np.newaxis]
+        rng = np.random.default_rng(self.seed)
+        levels = np.floor(-np.log(1.0 - rng.random(n)) / np.log(self.m)).astype(np.int64)
+
+        for layer in range(int(levels.max()) + 1):
+            nodes = np.flatnonzero(levels >= layer)
+            max_links = self.m * 2 if layer == 0 else self.m
+            links = self._link(unit[nodes], self.m, max_links, rng)
+            self.layers.append((nodes, np.where(links >= 0, nodes[np.maximum(links, 0)], -1)))
+        self.max_level = len(self.layers) - 1
+        self.entry_point = int(self.layers[-1][0][0])
+        self.size = n
+
+    def _link(self, unit, k, max_links, rng):
+        """Link table (rows x max_links, -1 padded): nearest rows and reverse links, then random long links."""
+        n = len(unit)
+        k = min(k, n - 1)
+        if k <= 0:
+            return np.full((n, max_links), -1, dtype=np.int64)
+        long_links = max_links // 4
+        near_links = max_links - long_links
+        neighbours = np.empty((n, k), dtype=np.int64)
+        scores = np.empty((n, k), dtype=np.float32)
+        for rows, candidates in self._candidate_blocks(unit):
+            block = unit[rows] @ unit[candidates].T
+            block[rows[:, np.newaxis] == candidates[np.newaxis, :]] = -np.inf
+            nearest = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            neighbours[rows] = candidates[nearest]
+            scores[rows] = np.take_along_axis(block, nearest, axis=1)
+
+        # Every edge in both directions, then per row the closest max_links distinct ones
+        sources = np.concatenate([np.repeat(np.arange(n), k), neighbours.ravel()])
+        targets = np.concatenate([neighbours.ravel(), np.repeat(np.arange(n), k)])
+        weights = np.concatenate([scores.ravel(), scores.ravel()])
+        order = np.lexsort((targets, -weights, sources))
+        sources, targets = sources[order], targets[order]
+        distinct = np.ones(len(sources), dtype=bool)
+        distinct[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        sources, targets = sources[distinct], targets[distinct]
+        first = np.searchsorted(sources, np.arange(n))
+        rank = np.arange(len(sources)) - first[sources]
+        kept = rank < near_links
+        table = np.full((n, max_links), -1, dtype=np.int64)
+        table[sources[kept], rank[kept]] = targets[kept]
+        # Offsets in [1, n) so a row never links to itself
+        table[:, near_links:] = (np.arange(n)[:, np.newaxis] + rng.integers(1, n, (n, long_links))) % n
+        return table
+
+    def _candidate_blocks(self, unit):
+        """Yield ``(rows, candidates)`` pairs covering every row, candidates being rows likely to be its neighbours."""
+        n = len(unit)
+        if n <= self.EXACT_ROWS:
+            everything = np.arange(n)
+            for start in range(0, n, self.BUCKET_ROWS):
+                yield everything[start:start + self.BUCKET_ROWS], everything
+            return
+        buckets = IVFIndex(n_lists=max(1, n // self.BUCKET_ROWS), seed=self.seed)
+        buckets.build(unit)
+        nearby = np.argsort(-(buckets.centroids @ buckets.centroids.T), axis=1)
+        counts = np.diff(buckets.list_offsets)
+        members = [
+            buckets.list_ids[buckets.list_offsets[bucket]:buckets.list_offsets[bucket + 1]]
+            for bucket in range(len(buckets.centroids))
+        ]
+        for bucket, rows in enumerate(members):
+            if not len(rows):
+                continue
+            # Probe further when the closest buckets are too small to hold a full neighbour list
+            probes = max(self.BUCKET_PROBES, int(np.searchsorted(np.cumsum(counts[nearby[bucket]]), self.m * 2)) + 1)
+            yield rows, np.concatenate([members[other] for other in nearby[bucket][:probes]])
+
+    def _scores(self, vectors, ids, query):
+        ids = np.asarray(ids, dtype=np.int64)
+        return (vectors[ids] @ query) * self.inverse_norms[ids]
+
+    def _search_layer(self, vectors, query, entry_points, ef, neighbours):
+        """Best-first search of one layer; returns ``(distance, id)`` pairs, nearest first."""
+        visited = set(entry_points)
+        distances = 1.0 - self._scores(vectors, entry_points, query)
+        candidates = [(float(d), node) for d, node in zip(distances, entry_points)]
+        heapq.heapify(candidates)
+        results = [(-d, node) for d, node in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -results[0][0]:
+                break
+            fresh = [n for n in neighbours(node) if n >= 0 and n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for d, n in zip(1.0 - self._scores(vectors, fresh, query), fresh):
+                d = float(d)
+                if len(results) < ef or d < -results[0][0]:
+                    heapq.heappush(candidates, (d, n))
+                    heapq.heappush(results, (-d, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-d, n) for d, n in results)
+
+    def _layer_neighbours(self, layer):
+        nodes, table = self.layers[layer]
+        if layer == 0:
+            return lambda node: table[node].tolist()
+        return lambda node: table[np.searchsorted(nodes, node)].tolist()
+
+    def search(self, vectors, query_vector, top_k, ef_search=None, **kwargs):
+        query = _unit(np.asarray(query_vector, dtype=np.float32))
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, 0, -1):
+            entry_points = [self._search_layer(vectors, query, entry_points, 1, self._layer_neighbours(layer))[0][1]]
+        ef = max(ef_search or self.ef_search, top_k)
+        found = self._search_layer(vectors, query, entry_points, ef, self._layer_neighbours(0))
+        return np.array([node for _, node in found], dtype=np.int64)
+
+    def params(self):
+        return {
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "seed": self.seed,
+        }
+
+    def arrays(self):
+        arrays = {
+            "hnsw_entry": np.array([self.entry_point, self.max_level], dtype=np.int64),
+            "hnsw_inverse_norms": self.inverse_norms,
+        }
+        for layer, (nodes, table) in enumerate(self.layers):
+            arrays[f"hnsw_nodes_{layer}"] = nodes
+            arrays[f"hnsw_links_{layer}"] = table
+        return arrays
+
+    def restore(self, arrays, size):
+        self.entry_point, self.max_level = (int(value) for value in arrays["hnsw_entry"])
+        self.inverse_norms = arrays["hnsw_inverse_norms"]
+        self.layers = [
+            (arrays[f"hnsw_nodes_{layer}"], arrays[f"hnsw_links_{layer}"])
+            for layer in range(self.max_level + 1)
+        ]
+        self.size = size
+
+
+INDEX_TYPES = {index.name: index for index in (FlatIndex, IVFIndex, HNSWIndex)}
+
+
+def create_index(index, **params):
+    if index not in INDEX_TYPES:
+        raise Exception(
+            f"Index type not supported. Please use one of {', '.join(repr(name) for name in INDEX_TYPES)}."
+        )
+    return INDEX_TYPES[index](**params)
@@ -0,0 +1,288 @@
+"""Sparse BM25 index over HyperDB documents for lexical retrieval.
+
+Postings are kept in CSR form (per-term slices of one row array and one
+term-frequency array), so a query only touches the postings of its own terms.
+Appended rows go to a new small CSR segment, and a segment is merged into the
+one before it once it reaches half its size, so appends touch O(log n) segments
+instead of rewriting every posting.
+Identifiers such as ``ERR_AUTH_001``, ``task.created`` or ``/v1/projects``
+are indexed both whole and split into their word parts.
+"""
+import re
+from collections import namedtuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[./:-]\w+)*")
+# \w includes "_", so word parts are runs of letters and digits only
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# Stored in the manifest; postings written by another tokenizer are rebuilt instead of restored
+TOKENIZER_VERSION = 2
+MAX_TOKEN_LENGTH = 64
+TEXT_FIELDS = ("content", "description")
+# A segment is merged into the one before it once it holds this share of that one's postings
+MERGE_RATIO = 0.5
+INITIAL_CAPACITY = 1024
+
+# One CSR segment: postings of term t are rows[offsets[t]:offsets[t + 1]], t < len(offsets) - 1
+Segment = namedtuple("Segment", "offsets rows tfs")
+# Everything search() reads, published with one assignment so it never sees half an update.
+# doc_lengths and deleted may have spare capacity past size.
+Postings = namedtuple("Postings", "segments doc_lengths deleted size live_count total_length")
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        if len(match) > MAX_TOKEN_LENGTH:
+            continue
+        tokens.append(match)
+        parts = WORD_PATTERN.findall(match)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def document_text(document):
+    if isinstance(document, dict):
+        for field in TEXT_FIELDS:
+            if isinstance(document.get(field), str):
+                return document[field]
+        return " ".join(str(value) for value in document.values())
+    return str(document)
+
+
+class BM25Index:
+    """Okapi BM25 with CSR postings; rows are appended in order like HyperDB rows.
+
+    Writers (add, remove, compact, restore) are serialised by the caller; search
+    reads one published ``Postings`` snapshot and needs no lock. Tombstoned rows
+    count towards neither the document count nor the average length, and their
+    postings are skipped when computing document frequencies.
+    """
+
+    name = "bm25"
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.reset()
+
+    def reset(self):
+        self.vocabulary = {}
+        self.terms = []
+        self._postings = Postings(
+            (),
+            np.empty(0, dtype=np.float32),
+            np.zeros(0, dtype=bool),
+            0,
+            0,
+            0.0,
+        )
+
+    @property
+    def size(self):
+        return self._postings.size
+
+    def add(self, start, documents):
+        """Index ``documents`` as rows ``start, start + 1, ...``; tombstones (None) index as deleted."""
+        term_ids, rows, tfs, lengths = [], [], [], []
+        for row, document in enumerate(documents, start):
+            counts = {}
+            if document is not None:
+                for token in tokenize(document_text(document)):
+                    counts[token] = counts.get(token, 0) + 1
+            lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                if token not in self.vocabulary:
+                    self.vocabulary[token] = len(self.terms)
+                    self.terms.append(token)
+                term_ids.append(self.vocabulary[token])
+                rows.append(row)
+                tfs.append(count)
+
+        postings = self._postings
+        size = start + len(documents)
+        doc_lengths, deleted = postings.doc_lengths, postings.deleted
+        if size > len(doc_lengths):
+            # Grow geometrically; rows past an older snapshot's size are never read through it
+            capacity = max(size, 2 * len(doc_lengths), INITIAL_CAPACITY)
+            doc_lengths = np.concatenate([doc_lengths[:postings.size], np.zeros(capacity - postings.size, dtype=np.float32)])
+            deleted = np.concatenate([deleted[:postings.size], np.zeros(capacity - postings.size, dtype=bool)])
+        lengths = np.array(lengths, dtype=np.float32)
+        doc_lengths[start:size] = lengths
+        deleted[start:size] = [document is None for document in documents]
+        live = ~deleted[start:size]
+
+        n_terms = len(self.terms)
+        segments = list(postings.segments)
+        segments.append(_segment(
+            np.array(term_ids, dtype=np.int64), np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32), n_terms
+        ))
+        while len(segments) > 1 and len(segments[-1].rows) >= MERGE_RATIO * len(segments[-2].rows):
+            segments[-2:] = [_merge(segments[-2:], n_terms)]
+        self._postings = Postings(
+            tuple(segments),
+            doc_lengths,
+            deleted,
+            size,
+            postings.live_count + int(live.sum()),
+            postings.total_length + float(lengths[live].sum()),
+        )
+
+    def remove(self, row):
+        """Tombstone an indexed row until compact() drops it."""
+        postings = self._postings
+        if row >= postings.size or postings.deleted[row]:
+            return
+        postings.deleted[row] = True
+        self._postings = postings._replace(
+            live_count=postings.live_count - 1,
+            total_length=postings.total_length - float(postings.doc_lengths[row]),
+        )
+
+    def compact(self, keep):
+        """Drop rows where ``keep`` is False and renumber the rest to match a compacted HyperDB."""
+        postings = self._postings
+        main = _merge(postings.segments, len(self.terms))
+        keep = keep[:postings.size] & ~postings.deleted[:postings.size]
+        new_rows = np.cumsum(keep) - 1
+        kept = keep[main.rows]
+        # Surviving postings keep their order, so each term's slice bounds shift by the drops before them
+        kept_before = np.concatenate([[0], np.cumsum(kept)]).astype(np.int64)
+        main = Segment(kept_before[main.offsets], new_rows[main.rows[kept]], main.tfs[kept])
+        doc_lengths = postings.doc_lengths[:postings.size][keep]
+        self._postings = Postings(
+            (main,),
+            doc_lengths,
+            np.zeros(len(doc_lengths), dtype=bool),
+            len(doc_lengths),
+            len(doc_lengths),
+            float(doc_lengths.sum()),
+        )
+
+    def statistics(self, query_text):
+        """``(documents, total_length, {token: document_frequency})`` over live rows for the query's tokens.
+
+        Summed across shards with ``combine_statistics`` and passed back to
+        ``search``, they make scores from separate indexes comparable.
+        """
+        postings = self._postings
+        frequencies = {}
+        for token in set(tokenize(query_text)):
+            if token in self.vocabulary:
+                frequencies[token] = len(_live_postings(postings, self.vocabulary[token])[0])
+        return postings.live_count, postings.total_length, frequencies
+
+    def search(self, query_text, statistics=None):
+        """Return ``(rows, scores)`` for every live row sharing a term with the query.
+
+        ``statistics`` (see ``statistics()``) replaces this index's own document
+        count, average length and document frequencies, e.g. with corpus-wide ones.
+        """
+        postings = self._postings
+        tokens = {token for token in tokenize(query_text) if token in self.vocabulary}
+        documents, total_length, frequencies = statistics or (postings.live_count, postings.total_length, None)
+        if not tokens or not documents:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        average_length = max(total_length / documents, 1.0)
+        rows, scores = [], []
+        for token in tokens:
+            term_rows, tfs = _live_postings(postings, self.vocabulary[token])
+            if not len(term_rows):
+                continue
+            frequency = len(term_rows) if frequencies is None else frequencies.get(token, len(term_rows))
+            idf = np.log(1.0 + (documents - frequency + 0.5) / (frequency + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * postings.doc_lengths[term_rows] / average_length)
+            rows.append(term_rows)
+            scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(scores)).astype(np.float32)
+
+    def params(self):
+        return {"k1": self.k1, "b": self.b}
+
+    def arrays(self):
+        postings = self._postings
+        main = _merge(postings.segments, len(self.terms))
+        encoded = [term.encode("utf-8") for term in self.terms]
+        return {
+            "bm25_terms": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "bm25_term_offsets": np.concatenate([[0], np.cumsum([len(term) for term in encoded])]).astype(np.int64),
+            "bm25_offsets": main.offsets,
+            "bm25_rows": main.rows,
+            "bm25_tfs": main.tfs,
+            "bm25_doc_lengths": postings.doc_lengths[:postings.size],
+        }
+
+    def restore(self, arrays, size):
+        blob = arrays["bm25_terms"].tobytes()
+        term_offsets = arrays["bm25_term_offsets"]
+        self.terms = [
+            blob[term_offsets[i]:term_offsets[i + 1]].decode("utf-8") for i in range(len(term_offsets) - 1)
+        ]
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        # Saved stores are compacted, so every restored row is live
+        doc_lengths = arrays["bm25_doc_lengths"]
+        self._postings = Postings(
+            (Segment(arrays["bm25_offsets"], arrays["bm25_rows"], arrays["bm25_tfs"]),),
+            doc_lengths,
+            np.zeros(size, dtype=bool),
+            size,
+            size,
+            float(np.sum(doc_lengths, dtype=np.float64)),
+        )
+
+
+def combine_statistics(statistics):
+    """Sum ``BM25Index.statistics()`` results from several indexes into corpus-wide ones."""
+    documents, total_length, frequencies = 0, 0.0, {}
+    for count, length, terms in statistics:
+        documents += count
+        total_length += length
+        for token, frequency in terms.items():
+            frequencies[token] = frequencies.get(token, 0) + frequency
+    return documents, total_length, frequencies
+
+
+def _segment(term_ids, rows, tfs, n_terms):
+    """CSR segment from unsorted ``(term, row, tf)`` postings; rows stay in order within a term."""
+    order = np.argsort(term_ids, kind="stable")
+    counts = np.bincount(term_ids, minlength=n_terms)
+    return Segment(np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), rows[order], tfs[order])
+
+
+def _merge(segments, n_terms):
+    """One segment holding every term's postings from ``segments`` in order."""
+    if len(segments) == 1 and len(segments[0].offsets) == n_terms + 1:
+        return segments[0]
+    return _segment(
+        np.concatenate([np.empty(0, dtype=np.int64)] + [
+            np.repeat(np.arange(len(segment.offsets) - 1), np.diff(segment.offsets)) for segment in segments
+        ]),
+        np.concatenate([np.empty(0, dtype=np.int64)] + [segment.rows for segment in segments]),
+        np.concatenate([np.empty(0, dtype=np.float32)] + [segment.tfs for segment in segments]),
+        n_terms,
+    )
+
+
+def _term_postings(postings, term_id):
+    """Rows and term frequencies of one term across all segments, rows ascending."""
+    rows, tfs = [], []
+    for segment in postings.segments:
+        if term_id < len(segment.offsets) - 1:
+            start, end = segment.offsets[term_id], segment.offsets[term_id + 1]
+            rows.append(segment.rows[start:end])
+            tfs.append(segment.tfs[start:end])
+    if len(rows) == 1:
+        return rows[0], tfs[0]
+    return np.concatenate([np.empty(0, dtype=np.int64)] + rows), np.concatenate([np.empty(0, dtype=np.float32)] + tfs)
+
+
+def _live_postings(postings, term_id):
+    rows, tfs = _term_postings(postings, term_id)
+    if postings.live_count < postings.size:
+        live = ~postings.deleted[rows]
+        rows, tfs = rows[live], tfs[live]
+    return rows, tfs
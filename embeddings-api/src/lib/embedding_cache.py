@@ -0,0 +1,125 @@
+"""Persistent, size-bounded embedding cache keyed by (model, text hash)."""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Eviction trims the cache to this share of max_entries, so the COUNT(*) it needs runs rarely
+EVICT_TO_RATIO = 0.9
+# Hits only record their recency in memory; it is written back once this many keys
+# are pending or this many seconds have passed, and always before an eviction
+TOUCH_FLUSH_KEYS = 1000
+TOUCH_FLUSH_SECONDS = 60
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors shared by every worker on the host."""
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            # Kept up to date by put_many; other workers' writes show up at the next eviction
+            (self._entries,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        """Return a list aligned with ``texts`` holding cached vectors or None for misses."""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time_ns()
+                self._touched.update((key, now) for key in found)
+                if len(self._touched) >= TOUCH_FLUSH_KEYS or time.monotonic() - self._flushed_at >= TOUCH_FLUSH_SECONDS:
+                    with self._connection:
+                        self._flush_touched()
+            vectors = [
+                np.frombuffer(found[key], dtype=np.float32) if key in found else None
+                for key in keys
+            ]
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return vectors
+
+    def put_many(self, model, texts, vectors):
+        now = time.time_ns()
+        rows = [
+            (self.make_key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock, self._connection:
+            # A key another worker stored meanwhile already holds the same vector, so it is left alone
+            inserted = self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            ).rowcount
+            self._entries += max(inserted, 0)
+            if self._entries > self.max_entries:
+                self._flush_touched()
+                self._evict()
+
+    def _flush_touched(self):
+        """Write pending hit times back in one statement batch; callers hold the lock and a transaction."""
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key, now in self._touched.items()],
+            )
+            self._touched = {}
+        self._flushed_at = time.monotonic()
+
+    def _evict(self):
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        target = int(self.max_entries * EVICT_TO_RATIO)
+        if count > target:
+            self._connection.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - target,),
+            )
+            logger.info(f"Evicted {count - target} least recently used embeddings from cache")
+            count = target
+        self._entries = count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,6 +1,7 @@
 """Super valuable proprietary algorithm for ranking vector similarity. Top secret."""
+import functools
+import inspect
 import numpy as np
-import random
 
 def get_norm_vector(vector):
     if len(vector.shape) == 1:
@@ -8,40 +9,146 @@ def get_norm_vector(vector):
     else:
         return vector / np.linalg.norm(vector, axis=1)[:, np.newaxis]
 
-def dot_product(vectors, query_vector):
-    similarities = np.dot(vectors, query_vector.T)
+def get_vector_norms(vectors):
+    return np.linalg.norm(vectors, axis=1)
+
+# Rows converted to float32 at a time when scoring a half-precision store
+SCORE_BLOCK_ROWS = 16384
+
+def _scores(vectors, query_vector):
+    """``vectors @ query_vector.T`` in float32.
+
+    NumPy would upcast a float16 memmap to float32 as a whole on every query,
+    so half-precision rows are converted and scored one block at a time.
+    """
+    if vectors.dtype != np.float16:
+        return np.dot(vectors, query_vector.T)
+    query = np.ascontiguousarray(query_vector.T, dtype=np.float32)
+    similarities = np.empty((len(vectors),) + query.shape[1:], dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        block = vectors[start:start + SCORE_BLOCK_ROWS]
+        np.dot(block.astype(np.float32), query, out=similarities[start:start + len(block)])
+    return similarities
+
+def _per_row(vector_norms, similarities):
+    # Batched queries score as an N x Q matrix, so row statistics need a column axis
+    return vector_norms if similarities.ndim == 1 else vector_norms[:, np.newaxis]
+
+def dot_product(vectors, query_vector, vector_norms=None):
+    similarities = _scores(vectors, query_vector)
     return similarities
 
-def cosine_similarity(vectors, query_vector):
-    norm_vectors = get_norm_vector(vectors)
-    norm_query_vector = get_norm_vector(query_vector)
-    similarities = np.dot(norm_vectors, norm_query_vector.T)
+def cosine_similarity(vectors, query_vector, vector_norms=None):
+    """Cosine as one GEMV; pass precomputed row norms to avoid normalising the corpus per query."""
+    if vector_norms is None:
+        vector_norms = get_vector_norms(vectors)
+    similarities = _scores(vectors, get_norm_vector(query_vector))
+    similarities /= _per_row(vector_norms, similarities)
     return similarities
 
-def euclidean_metric(vectors, query_vector, get_similarity_score=True):
-    similarities = np.linalg.norm(vectors - query_vector, axis=1)
+def euclidean_metric(vectors, query_vector, get_similarity_score=True, vector_norms=None):
+    if vector_norms is None:
+        vector_norms = get_vector_norms(vectors)
+    # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, so no per-query N x d difference matrix is needed
+    similarities = _scores(vectors, query_vector)
+    similarities *= -2
+    similarities += _per_row(vector_norms ** 2, similarities)
+    similarities += np.sum(query_vector * query_vector, axis=-1)
+    np.sqrt(np.maximum(similarities, 0, out=similarities), out=similarities)
     if get_similarity_score:
         similarities = 1 / (1 + similarities)
     return similarities
 
-def derridaean_similarity(vectors, query_vector):
-    def random_change(value):
-        return value + random.uniform(-0.2, 0.2)
+def negative_l2(vectors, query_vector, vector_norms=None):
+    """Negated euclidean distance, so larger is closer without squashing scores into (0, 1]."""
+    similarities = euclidean_metric(vectors, query_vector, get_similarity_score=False, vector_norms=vector_norms)
+    np.negative(similarities, out=similarities)
+    return similarities
+
+def normalized_inner_product(vectors, query_vector, vector_norms=None):
+    """Inner product for corpora that are already unit length: cosine without the per-row division."""
+    return _scores(vectors, get_norm_vector(query_vector))
+
+_default_rng = np.random.default_rng()
+
+def derridaean_similarity(vectors, query_vector, vector_norms=None, rng=None):
+    rng = _default_rng if rng is None else rng
+    similarities = cosine_similarity(vectors, query_vector, vector_norms=vector_norms)
+    similarities += rng.uniform(-0.2, 0.2, size=similarities.shape).astype(similarities.dtype)
+    return similarities
+
+def adams_similarity(vectors, query_vector, vector_norms=None):
+    shape = (len(vectors),) if query_vector.ndim == 1 else (len(vectors), len(query_vector))
+    return np.full(shape, 0.42)
+
+SIMILARITY_METRICS = {}
+
+def register_metric(name, metric, *aliases):
+    """Make ``metric`` resolvable by name from ``HyperDB(similarity_metric=...)``."""
+    for key in (name, *aliases):
+        SIMILARITY_METRICS[key] = metric
+    return metric
+
+register_metric("dot", dot_product, "dot_product")
+register_metric("cosine", cosine_similarity, "cosine_similarity")
+register_metric("euclidean", euclidean_metric, "euclidean_metric")
+register_metric("negative_l2", negative_l2)
+register_metric("normalized_inner_product", normalized_inner_product)
+register_metric("derrida", derridaean_similarity, "derridaean_similarity")
+register_metric("adams", adams_similarity, "adams_similarity")
 
-    similarities = cosine_similarity(vectors, query_vector)
-    derrida_similarities = np.vectorize(random_change)(similarities)
-    return derrida_similarities
+def _accepts(metric, name):
+    parameters = inspect.signature(metric).parameters.values()
+    return any(parameter.name == name or parameter.kind is inspect.Parameter.VAR_KEYWORD for parameter in parameters)
 
-def adams_similarity(vectors, query_vector):
-    def adams_change(value):
-        return 0.42
+def _ignore_vector_norms(metric):
+    @functools.wraps(metric)
+    def wrapper(vectors, query_vector, vector_norms=None):
+        return metric(vectors, query_vector)
+    return wrapper
 
-    similarities = cosine_similarity(vectors, query_vector)
-    adams_similarities = np.vectorize(adams_change)(similarities)
-    return adams_similarities
+def get_metric(metric, seed=None):
+    """Resolve a registered metric name or a callable; ``seed`` fixes the jitter of metrics taking an ``rng``.
 
-def hyper_SVM_ranking_algorithm_sort(vectors, query_vector, top_k=5, metric=cosine_similarity):
+    Callers always pass the cached row norms as ``vector_norms``; a metric
+    written as plain ``(vectors, query_vector)`` is wrapped to ignore them.
+    """
+    if isinstance(metric, str):
+        if metric not in SIMILARITY_METRICS:
+            raise Exception(
+                f"Similarity metric not supported. Please use one of {', '.join(repr(name) for name in SIMILARITY_METRICS)}."
+            )
+        metric = SIMILARITY_METRICS[metric]
+    if seed is not None and "rng" in inspect.signature(metric).parameters:
+        metric = functools.partial(metric, rng=np.random.default_rng(seed))
+    if not _accepts(metric, "vector_norms"):
+        metric = _ignore_vector_norms(metric)
+    return metric
+
+def top_k_indices(similarities, top_k):
+    """Indices of the top_k largest similarities, best first, via argpartition instead of a full sort.
+
+    An N x Q similarity matrix yields a Q x top_k array, one row per query column.
+    """
+    if similarities.ndim == 2:
+        k = max(0, min(top_k, len(similarities)))
+        return np.array([top_k_indices(column, top_k) for column in similarities.T], dtype=np.int64).reshape(similarities.shape[1], k)
+    n = len(similarities)
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k >= n:
+        candidates = np.arange(n)
+    else:
+        candidates = np.argpartition(similarities, n - top_k)[n - top_k:]
+    return candidates[np.argsort(similarities[candidates])[::-1]]
+
+def hyper_SVM_ranking_algorithm_sort(vectors, query_vector, top_k=5, metric=cosine_similarity, vector_norms=None):
     """HyperSVMRanking (Such Vector, Much Ranking) algorithm proposed by Andrej Karpathy (2023) https://arxiv.org/abs/2303.18231"""
-    similarities = metric(vectors, query_vector)
-    top_indices = np.argsort(similarities, axis=0)[-top_k:][::-1]
-    return top_indices.flatten(), similarities[top_indices].flatten()
\ No newline at end of file
+    if vector_norms is None:
+        similarities = metric(vectors, query_vector)
+    else:
+        similarities = metric(vectors, query_vector, vector_norms=vector_norms)
+    top_indices = top_k_indices(similarities, top_k)
+    if similarities.ndim == 2:
+        return top_indices, np.take_along_axis(similarities.T, top_indices, axis=1)
+    return top_indices, similarities[top_indices]
\ No newline at end of file
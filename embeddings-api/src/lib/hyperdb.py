@@ -1,26 +1,55 @@
-import gzip
-import pickle
+import asyncio
 import logging
 import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 from ..global_config import GlobalConfig
-from langchain_community.embeddings import OllamaEmbeddings
+from ..ollama_clients import get_embeddings_client
+from . import storage
+from .ann_index import create_index
+from .quantization import create_quantizer
+from .metadata_index import MetadataIndex
+from .bm25_index import TOKENIZER_VERSION, BM25Index
+from .embedding_cache import EmbeddingCache
+from .metrics import export_cache_stats, stage_timer
 
 from .galaxy_brain_math import (
-    dot_product,
-    adams_similarity,
-    cosine_similarity,
-    derridaean_similarity,
-    euclidean_metric,
+    get_metric,
+    get_vector_norms,
     hyper_SVM_ranking_algorithm_sort,
+    top_k_indices,
 )
 
 MAX_BATCH_SIZE = 100  # Reduced batch size for local processing
+QUERY_BLOCK_ELEMENTS = 2 ** 24  # Upper bound on the N x queries similarity matrix in query_batch
+INITIAL_CAPACITY = 10000  # Rows preallocated before the first insert
+GROWTH_FACTOR = 2  # Capacity multiplier when row storage is full
+COMPACT_RATIO = 0.5  # Share of tombstoned rows that triggers compaction
+QUANTIZED_SHORTLIST_FACTOR = 10  # Candidates per result scored exactly after a quantised scan
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+RRF_K = 60  # Reciprocal rank fusion constant; larger values flatten the gap between ranks
+HYBRID_DEPTH = 50  # Minimum results taken from each retriever before fusing
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+_embedding_cache = None
+
+def get_embedding_cache():
+    """Process-wide embedding cache, or None when EMBEDDING_CACHE_PATH is empty."""
+    global _embedding_cache
+    config = GlobalConfig()
+    if _embedding_cache is None and config.embedding_cache_path:
+        _embedding_cache = EmbeddingCache(
+            config.embedding_cache_path, max_entries=config.embedding_cache_max_entries
+        )
+        export_cache_stats("embedding", _embedding_cache)
+    return _embedding_cache
+
 def get_embedding(documents, key=None):
     """Embedding function that uses Ollama Embeddings."""
     logger.info(f"Starting embedding generation for {len(documents) if isinstance(documents, list) else 1} documents")
@@ -29,12 +58,83 @@ def get_embedding(documents, key=None):
     logger.info(f"Using Ollama embeddings model: {config.ollama_embeddings_model}")
     logger.info(f"Ollama base URL: {config.ollama_base_url}")
     
-    # Initialize Ollama embeddings
-    embeddings_model = OllamaEmbeddings(
-        model=config.ollama_embeddings_model,
-        base_url=config.ollama_base_url
-    )
+    # Shared client with a keep-alive connection pool
+    embeddings_model = get_embeddings_client()
+    
+    texts = _prepare_texts(documents, key)
+    logger.info(f"Prepared {len(texts)} text chunks for embedding")
+    
+    # Serve repeated texts from the cache and only embed the misses
+    cache, cached_embeddings, missing = _lookup_cache(config, texts)
+    texts_to_embed = [texts[i] for i in missing]
+    
+    # Process in batches, keeping up to embedding_concurrency batches in flight
+    batches = [
+        texts_to_embed[i : i + MAX_BATCH_SIZE] for i in range(0, len(texts_to_embed), MAX_BATCH_SIZE)
+    ]
+    concurrency = max(1, min(config.embedding_concurrency, len(batches)))
+    logger.info(f"Processing embeddings in {len(batches)} batches (max {MAX_BATCH_SIZE} per batch, {concurrency} in flight)")
+    
+    batch_embeddings = [None] * len(batches)
+    failed_batches = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_embed_batch, embeddings_model, batch, i, len(batches)): i
+            for i, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                batch_embeddings[i] = future.result()
+            except Exception as e:
+                logger.error(f"Error generating embeddings for batch {i+1}/{len(batches)}: {e}")
+                failed_batches += 1
+                continue
+            # Cache each batch as it lands so a retry of the whole call only redoes failed batches
+            if cache is not None:
+                cache.put_many(config.ollama_embeddings_model, batches[i], batch_embeddings[i])
+    
+    if failed_batches:
+        logger.error(f"Failed to generate embeddings for {failed_batches}/{len(batches)} batches")
+        return []
+    
+    all_embeddings = [embedding for batch in batch_embeddings for embedding in batch]
+    logger.info(f'Successfully generated {len(all_embeddings)} total embeddings')
+    for i, embedding in zip(missing, all_embeddings):
+        cached_embeddings[i] = embedding
+    return cached_embeddings
+
+async def aget_embedding(documents, key=None):
+    """Async counterpart of get_embedding for the request path; never blocks the event loop on HTTP."""
+    config = GlobalConfig()
+    texts = _prepare_texts(documents, key)
+    # SQLite reads and writes, and the cache lock shared with a running reindex, stay off the event loop
+    cache, cached_embeddings, missing = await asyncio.to_thread(_lookup_cache, config, texts)
+    if not missing:
+        return cached_embeddings
+    
+    texts_to_embed = [texts[i] for i in missing]
+    embeddings_model = get_embeddings_client()
+    for attempt in range(config.embedding_max_retries + 1):
+        try:
+            embeddings = [np.array(emb) for emb in await embeddings_model.aembed_documents(texts_to_embed)]
+            break
+        except Exception as e:
+            if attempt == config.embedding_max_retries:
+                logger.error(f"Error generating embeddings: {e}")
+                return []
+            delay = config.embedding_retry_backoff * 2 ** attempt
+            logger.warning(f"Embedding request failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
     
+    if cache is not None:
+        await asyncio.to_thread(cache.put_many, config.ollama_embeddings_model, texts_to_embed, embeddings)
+    for i, embedding in zip(missing, embeddings):
+        cached_embeddings[i] = embedding
+    return cached_embeddings
+
+def _prepare_texts(documents, key=None):
+    """Turn documents (strings, or dicts read through ``key``) into the texts that get embedded."""
     if isinstance(documents, list):
         if isinstance(documents[0], dict):
             texts = []
@@ -55,29 +155,52 @@ def get_embedding(documents, key=None):
             texts = documents
     else:
         texts = [documents] if isinstance(documents, str) else [str(documents)]
-    
-    logger.info(f"Prepared {len(texts)} text chunks for embedding")
-    
-    try:
-        # Process in batches
-        batches = [
-            texts[i : i + MAX_BATCH_SIZE] for i in range(0, len(texts), MAX_BATCH_SIZE)
-        ]
-        
-        logger.info(f"Processing embeddings in {len(batches)} batches (max {MAX_BATCH_SIZE} per batch)")
-        
-        all_embeddings = []
-        for i, batch in enumerate(batches):
-            logger.info(f'Creating embeddings for batch {i+1}/{len(batches)} ({len(batch)} items)')
-            batch_embeddings = embeddings_model.embed_documents(batch)
-            all_embeddings.extend([np.array(emb) for emb in batch_embeddings])
-            logger.info(f'Completed batch {i+1}/{len(batches)} - generated {len(batch_embeddings)} embeddings')
-        
-        logger.info(f'Successfully generated {len(all_embeddings)} total embeddings')
-        return all_embeddings
-    except Exception as e:
-        logger.error(f"Error generating embeddings: {e}")
-        return []
+    return texts
+
+def _lookup_cache(config, texts):
+    """Returns ``(cache, embeddings, missing)`` where ``embeddings`` has None at the ``missing`` positions."""
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached_embeddings = cache.get_many(config.ollama_embeddings_model, texts)
+    else:
+        cached_embeddings = [None] * len(texts)
+    missing = [i for i, embedding in enumerate(cached_embeddings) if embedding is None]
+    if cache is not None:
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+    return cache, cached_embeddings, missing
+
+def _embed_batch(embeddings_model, batch, batch_index, batch_count):
+    """Embed one batch, retrying with exponential backoff before giving up."""
+    config = GlobalConfig()
+    for attempt in range(config.embedding_max_retries + 1):
+        try:
+            logger.info(f'Creating embeddings for batch {batch_index+1}/{batch_count} ({len(batch)} items)')
+            embeddings = [np.array(emb) for emb in embeddings_model.embed_documents(batch)]
+            logger.info(f'Completed batch {batch_index+1}/{batch_count} - generated {len(embeddings)} embeddings')
+            return embeddings
+        except Exception as e:
+            if attempt == config.embedding_max_retries:
+                raise
+            delay = config.embedding_retry_backoff * 2 ** attempt
+            logger.warning(f"Batch {batch_index+1}/{batch_count} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def reciprocal_rank_fusion(rankings, top_k):
+    """Fuse ranked lists of keys; returns the top_k ``(keys, scores)``, best first.
+
+    Scores are scaled so a key ranked first by every list scores 1.0.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+    if not fused:
+        return [], np.empty(0, dtype=np.float32)
+    keys = list(fused)
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused)) * ((RRF_K + 1) / len(rankings))
+    order = top_k_indices(scores, top_k)
+    return [keys[i] for i in order], scores[order]
 
 
 class HyperDB:
@@ -88,163 +211,648 @@ class HyperDB:
         key=None,
         embedding_function=None,
         similarity_metric="cosine",
+        index="flat",
+        index_params=None,
+        metric_seed=None,
+        quantization=None,
+        quantization_params=None,
+        rerank=True,
     ):
         logger.info("Initializing HyperDB instance")
         documents = documents or []
         self.documents = []
         self.current_index = 0
         self.vectors = None
+        self.vector_norms = None
+        self.doc_ids = None
+        self.deleted = None
+        self.deleted_count = 0
+        self.next_id = 0
+        self.metadata = {}
+        self._close_documents = None
+        self.index = create_index(index, **(index_params or {}))
+        self.quantizer = create_quantizer(quantization, **(quantization_params or {}))
+        self.rerank = rerank
+        self.metadata_index = MetadataIndex()
+        self.bm25_index = BM25Index()
+        self._lazy_index_lock = threading.Lock()
         self.embedding_function = embedding_function or (
             lambda docs: get_embedding(docs, key=key)
         )
+        # Custom embedding functions are synchronous and get pushed to a worker thread by aquery
+        self.async_embedding_function = None if embedding_function else (
+            lambda docs: aget_embedding(docs, key=key)
+        )
         
-        logger.info(f"HyperDB similarity metric: {similarity_metric}")
+        self.similarity_metric = get_metric(similarity_metric, seed=metric_seed)
+        logger.info(f"HyperDB similarity metric: {similarity_metric}, index: {index}")
         
         # Initialize with a dummy vector to get dimensions
         if not documents and vectors is None:
             logger.info("Getting embedding dimensions with dummy vector")
-            dummy_vector = self.embedding_function(["dummy"])
-            if dummy_vector:
-                vector_length = len(dummy_vector[0])
-                logger.info(f"Detected embedding dimension: {vector_length}")
-                self.vectors = np.empty((10000, vector_length), dtype=np.float32)
-            else:
-                logger.warning("Failed to get embedding dimensions, using default 384")
-                self.vectors = np.empty((10000, 384), dtype=np.float32)  # Default MiniLM dimension
+            self._allocate(self._probe_dimension())
         else:
             if vectors is not None:
                 logger.info(f"Loading HyperDB with pre-computed vectors: {len(vectors)} vectors")
-                self.vectors = vectors
-                self.documents = documents
-                self.current_index = len(self.documents)
+                self._set_rows(vectors, documents)
             else:
                 logger.info("Initializing HyperDB with documents for embedding generation")
-                dummy_vector = self.embedding_function(["dummy"])
-                if dummy_vector:
-                    vector_length = len(dummy_vector[0])
-                    logger.info(f"Detected embedding dimension: {vector_length}")
-                    self.vectors = np.empty((10000, vector_length), dtype=np.float32)
-                else:
-                    logger.warning("Failed to get embedding dimensions, using default 384")
-                    self.vectors = np.empty((10000, 384), dtype=np.float32)
+                self._allocate(self._probe_dimension())
                 logger.info(f"Adding {len(documents)} documents to HyperDB")
                 self.add_documents(documents)
         
-        logger.info(f"HyperDB initialized with {self.current_index} documents")
-
-        if similarity_metric.__contains__("dot"):
-            self.similarity_metric = dot_product
-        elif similarity_metric.__contains__("cosine"):
-            self.similarity_metric = cosine_similarity
-        elif similarity_metric.__contains__("euclidean"):
-            self.similarity_metric = euclidean_metric
-        elif similarity_metric.__contains__("derrida"):
-            self.similarity_metric = derridaean_similarity
-        elif similarity_metric.__contains__("adams"):
-            self.similarity_metric = adams_similarity
-        else:
-            raise Exception(
-                "Similarity metric not supported. Please use either 'dot', 'cosine', 'euclidean', 'adams', or 'derrida'."
-            )
+        logger.info(f"HyperDB initialized with {len(self)} documents")
+
+    def __len__(self):
+        """Number of live documents; tombstoned rows are not counted."""
+        return self.current_index - self.deleted_count
+
+    def _probe_dimension(self):
+        dummy_vector = self.embedding_function(["dummy"])
+        if dummy_vector:
+            vector_length = len(dummy_vector[0])
+            logger.info(f"Detected embedding dimension: {vector_length}")
+            return vector_length
+        logger.warning("Failed to get embedding dimensions, using default 384")
+        return 384  # Default MiniLM dimension
+
+    def _allocate(self, dim, capacity=INITIAL_CAPACITY):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.vector_norms = np.empty(capacity, dtype=np.float32)
+        self.doc_ids = np.empty(capacity, dtype=np.int64)
+        self.deleted = np.zeros(capacity, dtype=bool)
+
+    def _set_rows(self, vectors, documents, doc_ids=None, vector_norms=None, next_id=None):
+        """Adopt existing rows (possibly read-only memory maps) without copying them."""
+        count = len(documents)
+        self._release_documents()
+        self.vectors = vectors
+        self.documents = documents
+        if isinstance(documents, storage.DocumentStore):
+            # Closes the document file when this instance is collected, e.g. once the
+            # last query holding a store replaced by reindex returns
+            self._close_documents = weakref.finalize(self, documents.close)
+        self.current_index = count
+        self.vector_norms = vector_norms if vector_norms is not None else (
+            get_vector_norms(vectors[:count]).astype(np.float32) if count else np.empty(0, dtype=np.float32)
+        )
+        self.doc_ids = doc_ids if doc_ids is not None else np.arange(count, dtype=np.int64)
+        self.deleted = np.zeros(count, dtype=bool)
+        self.deleted_count = 0
+        self.next_id = next_id if next_id is not None else (int(self.doc_ids[-1]) + 1 if count else 0)
+
+    def _release_documents(self):
+        if self._close_documents is not None:
+            self._close_documents()
+            self._close_documents = None
+
+    def close(self):
+        """Close the files and memory maps of a loaded store; the instance is empty afterwards."""
+        self._set_rows(np.empty((0, 0), dtype=np.float32), [])
+        self.index.reset()
+        if self.quantizer is not None:
+            self.quantizer.reset()
+        self.metadata_index.reset()
+        self.bm25_index.reset()
 
     def dict(self, vectors=False):
         if vectors:
             return [
-                {"document": document, "vector": vector.tolist(), "index": index}
-                for index, (document, vector) in enumerate(
-                    zip(self.documents, self.vectors[:self.current_index])
-                )
+                {"document": document, "vector": vector.tolist(), "index": doc_id}
+                for doc_id, document, vector in self.items()
             ]
         return [
-            {"document": document, "index": index}
-            for index, document in enumerate(self.documents)
+            {"document": document, "index": doc_id}
+            for doc_id, document, _ in self.items()
         ]
 
+    def items(self):
+        """Yield ``(doc_id, document, vector)`` for every live row."""
+        for row in range(self.current_index):
+            if not self.deleted[row]:
+                yield int(self.doc_ids[row]), self.documents[row], self.vectors[row]
+
     def add(self, documents, vectors=None):
         if not isinstance(documents, list):
             return self.add_document(documents, vectors)
-        self.add_documents(documents, vectors)
+        return self.add_documents(documents, vectors)
 
     def add_document(self, document, vector=None):
+        """Add one document and return its stable id, or None if it could not be embedded."""
         if vector is None:
             embeddings = self.embedding_function([document])
             if not embeddings:
                 logging.warning(f"Failed to generate embedding for document: {document}")
-                return
+                return None
             vector = embeddings[0]
-        
-        if self.current_index >= len(self.vectors):
-            # Expand the array
-            new_vectors = np.empty((10000, len(vector)), dtype=np.float32)
-            self.vectors = np.vstack([self.vectors, new_vectors])
-        
-        self.vectors[self.current_index] = vector
-        self.current_index += 1
-        self.documents.append(document)
-
-    def finalize(self): 
-        self.vectors = self.vectors[:self.current_index]
-        
-    def remove_document(self, index):
-        self.vectors = np.delete(self.vectors, index, axis=0)
-        self.documents.pop(index)
-        self.current_index -= 1
+        return self._append([document], [vector])[0]
 
     def add_documents(self, documents, vectors=None):
+        """Add documents with one slice assignment per array and return their stable ids."""
         if not documents:
-            return
+            return []
         
         if vectors is None:
             vectors = self.embedding_function(documents)
             if not vectors:
                 logging.warning("Failed to generate embeddings for documents")
-                return
+                return []
+        
+        return self._append(documents, vectors)
+
+    def _append(self, documents, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        count = len(vectors)
+        start = self.current_index
+        self._reserve(start + count, vectors.shape[1])
+        self.vectors[start:start + count] = vectors
+        self.vector_norms[start:start + count] = get_vector_norms(vectors)
+        doc_ids = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        self.doc_ids[start:start + count] = doc_ids
+        self.deleted[start:start + count] = False
+        self.documents.extend(documents)
+        self.current_index += count
+        self.next_id += count
+        return doc_ids.tolist()
+
+    def _reserve(self, rows, dim):
+        """Grow row storage geometrically so appending n rows costs O(n) copies overall."""
+        self._ensure_writable()
+        if self.current_index == 0 and self.vectors.shape[1] != dim:
+            self._allocate(dim, max(rows, INITIAL_CAPACITY))
+            return
+        capacity = len(self.vectors)
+        if rows <= capacity:
+            return
+        capacity = max(rows, int(capacity * GROWTH_FACTOR), INITIAL_CAPACITY)
+        count = self.current_index
+        grown = self.vectors, self.vector_norms, self.doc_ids, self.deleted
+        self._allocate(dim, capacity)
+        self.vectors[:count] = grown[0][:count]
+        self.vector_norms[:count] = grown[1][:count]
+        self.doc_ids[:count] = grown[2][:count]
+        self.deleted[:count] = grown[3][:count]
+
+    def finalize(self): 
+        self.compact(rebuild_index=False)
+        self.vectors = self.vectors[:self.current_index]
+        self.vector_norms = self.vector_norms[:self.current_index]
+        self.doc_ids = self.doc_ids[:self.current_index]
+        self.deleted = self.deleted[:self.current_index]
+        if self.index.name != "flat":
+            logger.info(f"Building {self.index.name} index over {self.current_index} vectors")
+        self.index.build(self.vectors)
+        if self.quantizer is not None:
+            logger.info(f"Encoding {self.current_index} vectors with {self.quantizer.name} quantization")
+            self.quantizer.build(self.vectors)
         
-        for vector, document in zip(vectors, documents):
-            self.add_document(document, vector)
+    def remove_document(self, doc_id, compact=True):
+        """Tombstone a document by its stable id; rows are reclaimed by compact().
+
+        Pass ``compact=False`` when finalize() follows anyway, so a bulk delete
+        does not rebuild the ANN index once here and again there.
+        """
+        row = self._row(doc_id)
+        self._ensure_writable()
+        self.deleted[row] = True
+        self.documents[row] = None
+        self.deleted_count += 1
+        with self._lazy_index_lock:
+            # Keeps BM25 document counts and lengths to live rows until compaction
+            self.bm25_index.remove(row)
+        # Compacting once tombstones outnumber a fixed share of rows keeps deletes amortised O(1)
+        if compact and self.deleted_count > COMPACT_RATIO * self.current_index:
+            self.compact()
+
+    def _row(self, doc_id):
+        # Ids are handed out in increasing order and compaction keeps row order, so ids stay sorted
+        row = int(np.searchsorted(self.doc_ids[:self.current_index], doc_id))
+        if row >= self.current_index or self.doc_ids[row] != doc_id or self.deleted[row]:
+            raise KeyError(f"Document {doc_id} not found")
+        return row
+
+    def compact(self, rebuild_index=True):
+        """Drop tombstoned rows in one pass; document ids are unchanged.
+
+        Row positions shift, so a built ANN index is rebuilt over the surviving
+        rows unless ``rebuild_index`` is False (finalize() builds it right after).
+        """
+        if not self.deleted_count:
+            return
+        logger.info(f"Compacting {self.deleted_count} deleted rows out of {self.current_index}")
+        self._ensure_writable()
+        keep = ~self.deleted[:self.current_index]
+        live = np.flatnonzero(keep)
+        self.vectors = self.vectors[live]
+        self.vector_norms = self.vector_norms[live]
+        self.doc_ids = self.doc_ids[live]
+        self.deleted = np.zeros(len(live), dtype=bool)
+        self.documents = [self.documents[row] for row in live]
+        if self.quantizer is not None and self.quantizer.size:
+            # Codes move with their rows, so they stay valid without re-encoding
+            self.quantizer.compact(keep[:self.quantizer.size])
+        if self.metadata_index.size:
+            self.metadata_index.compact(keep)
+        if self.bm25_index.size:
+            self.bm25_index.compact(keep)
+        indexed = self.index.size
+        self.index.reset()
+        self.current_index = len(live)
+        self.deleted_count = 0
+        if rebuild_index and indexed:
+            if self.index.name != "flat":
+                logger.info(f"Rebuilding {self.index.name} index over {self.current_index} vectors")
+            self.index.build(self.vectors)
 
-    def save(self, storage_file):
+    def get_vector_norms(self):
+        """Row norms, computed once per row when it is added and reused by every query."""
+        return self.vector_norms[:self.current_index]
+
+    def save(self, storage_file, dtype="float32", metadata=None):
+        """Write a versioned store directory; use dtype="float16" to halve its size.
+
+        ``metadata`` is any JSON-serialisable dict kept in the manifest and restored as ``self.metadata``.
+        Tombstoned rows are compacted away first, so only live documents are written.
+        """
+        if metadata is not None:
+            self.metadata = metadata
+        self.compact()
+        self._update_metadata_index()
+        self._update_bm25_index()
         logger.info(f"Saving HyperDB to {storage_file}")
         logger.info(f"Saving {self.current_index} documents and their vectors")
-        data = {"vectors": self.vectors[:self.current_index], "documents": self.documents}
-        with gzip.open(storage_file, "wb") as f:
-            pickle.dump(data, f)
-        file_size = os.path.getsize(storage_file) / (1024*1024)
+        storage.write_store(
+            storage_file,
+            self.vectors[:self.current_index],
+            list(self.documents[:self.current_index]),
+            dtype=dtype,
+            extra={
+                "next_id": self.next_id,
+                "index": {"type": self.index.name, "size": self.index.size, "params": self.index.params()},
+                "quantization": self._quantization_info(),
+                "metadata_index": self.metadata_index.info(),
+                "bm25": {"size": self.bm25_index.size, "params": self.bm25_index.params(), "tokenizer": TOKENIZER_VERSION},
+                "metadata": self.metadata,
+            },
+            arrays={
+                "vector_norms": self.get_vector_norms(),
+                "doc_ids": self.doc_ids[:self.current_index],
+                **(self.index.arrays() if self.index.size else {}),
+                **(self.quantizer.arrays() if self.quantizer is not None and self.quantizer.size else {}),
+                **self.metadata_index.arrays(),
+                **self.bm25_index.arrays(),
+            },
+        )
+        file_size = storage.store_size(storage_file) / (1024*1024)
         logger.info(f"Successfully saved HyperDB to {storage_file} ({file_size:.2f} MB)")
 
     def load(self, storage_file):
+        """Memory-map a store directory, or read a legacy ``.pickle.gz`` file into RAM."""
         try:
             logger.info(f"Loading HyperDB from {storage_file}")
-            with gzip.open(storage_file, "rb") as f:
-                data = pickle.load(f)
-            self.vectors = data["vectors"].astype(np.float32)
-            self.documents = data["documents"]
-            self.current_index = len(self.documents)
-            file_size = os.path.getsize(storage_file) / (1024*1024)
+            store_dir = storage.resolve_store(storage_file)
+            if store_dir is not None:
+                vectors, documents, manifest = storage.read_store(store_dir)
+                arrays = storage.read_arrays(store_dir, manifest)
+                self.metadata = manifest.get("metadata", {})
+                index_info = manifest.get("index", {"size": 0})
+                quantization_info = manifest.get("quantization", {"size": 0})
+                file_size = storage.store_size(store_dir) / (1024*1024)
+            else:
+                vectors, documents = storage.read_legacy_pickle(storage_file)
+                manifest = {}
+                arrays = {}
+                index_info = {"size": 0}
+                quantization_info = {"size": 0}
+                file_size = os.path.getsize(storage_file) / (1024*1024)
+            self._set_rows(
+                vectors,
+                documents,
+                doc_ids=arrays.get("doc_ids"),
+                vector_norms=arrays.get("vector_norms"),
+                next_id=manifest.get("next_id"),
+            )
+            if index_info["size"] and index_info["type"] == self.index.name:
+                self.index = create_index(index_info["type"], **index_info["params"])
+                self.index.restore(arrays, index_info["size"])
+            elif self.current_index:
+                if self.index.name != "flat":
+                    logger.info(f"No persisted {self.index.name} index found, building it")
+                self.index.build(self.vectors)
+            self.metadata_index.reset()
+            if "metadata_index" in manifest:
+                self.metadata_index.restore(arrays, manifest["metadata_index"])
+            self.bm25_index.reset()
+            if "bm25" in manifest:
+                self.bm25_index = BM25Index(**manifest["bm25"]["params"])
+                if manifest["bm25"].get("tokenizer", 1) == TOKENIZER_VERSION:
+                    self.bm25_index.restore(arrays, manifest["bm25"]["size"])
+                else:
+                    logger.info("BM25 postings were built by an older tokenizer, rebuilding them on first use")
+            if quantization_info["size"]:
+                self.quantizer = create_quantizer(quantization_info["type"], **quantization_info["params"])
+                self.quantizer.restore(arrays, quantization_info["size"])
+            elif self.quantizer is not None and self.current_index:
+                logger.info(f"No persisted codes found, encoding vectors with {self.quantizer.name} quantization")
+                self.quantizer.build(self.vectors)
             logger.info(f"Successfully loaded HyperDB from {storage_file} ({file_size:.2f} MB)")
             logger.info(f"Loaded {self.current_index} documents with vectors")
         except FileNotFoundError:
             logger.error(f"HyperDB file {storage_file} not found.")
 
-    def query(self, query_text, top_k=5, return_similarities=True):
-        logger.info(f"Querying HyperDB with top_k={top_k}")
-        if self.current_index == 0:
+    @classmethod
+    def from_storage(cls, storage_file, **kwargs):
+        """Open a saved HyperDB without probing the embedding model for its dimension."""
+        db = cls(vectors=np.empty((0, 0), dtype=np.float32), **kwargs)
+        db.load(storage_file)
+        return db
+
+    def _quantization_info(self):
+        if self.quantizer is None or not self.quantizer.size:
+            return {"size": 0}
+        return {"type": self.quantizer.name, "size": self.quantizer.size, "params": self.quantizer.params()}
+
+    def _ensure_writable(self):
+        # Loaded stores are read-only memory maps; copy them on first mutation.
+        if isinstance(self.vectors, np.memmap) or self.vectors.dtype != np.float32:
+            self.vectors = np.array(self.vectors[:self.current_index], dtype=np.float32)
+        for name in ("vector_norms", "doc_ids", "deleted"):
+            if isinstance(getattr(self, name), np.memmap):
+                setattr(self, name, np.array(getattr(self, name)))
+        if not isinstance(self.documents, list):
+            self.documents = list(self.documents)
+            self._release_documents()
+
+    def query(self, query_text, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector"):
+        """Rank documents against ``query_text``.
+
+        ``n_probe`` (IVF) and ``ef_search`` (HNSW) trade latency for recall on
+        approximate indexes and are ignored by the flat index. ``filter``
+        restricts ranking to documents whose metadata matches (see
+        ``metadata_index``); only the matching rows are scored.
+
+        ``mode`` is ``"vector"`` (embedding similarity), ``"lexical"`` (BM25
+        scores, no embedding call) or ``"hybrid"`` (both rankings fused with
+        reciprocal rank fusion, scaled so 1.0 means ranked first by both).
+        """
+        logger.info(f"Querying HyperDB with top_k={top_k}, mode={mode}")
+        self._check_mode(mode)
+        if len(self) == 0:
             logger.warning("HyperDB is empty, returning no results")
             return [] if return_similarities else []
+        if mode == "lexical":
+            with stage_timer("search"):
+                ranked_results, similarities = self._rank_lexical(query_text, top_k, self._filtered_rows(filter))
+            logger.info(f"Found {len(ranked_results)} matching documents")
+            return self._results(ranked_results, similarities, return_similarities)
             
-        query_embeddings = self.embedding_function([query_text])
+        with stage_timer("query_embedding"):
+            query_embeddings = self.embedding_function([query_text])
         if not query_embeddings:
             logger.error("Failed to generate query embedding")
             return [] if return_similarities else []
             
-        query_vector = query_embeddings[0]
+        # Match the corpus dtype so the GEMV does not upcast the whole matrix to float64
+        query_vector = np.asarray(query_embeddings[0], dtype=np.float32)
         logger.info("Performing similarity search...")
+        with stage_timer("search"):
+            ranked_results, similarities = self._rank_mode(
+                mode, query_text, query_vector, top_k, n_probe, ef_search, self._filtered_rows(filter)
+            )
+        logger.info(f"Found {len(ranked_results)} similar documents")
+        return self._results(ranked_results, similarities, return_similarities)
+
+    async def aquery(self, query_text, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector", query_vector=None):
+        """Async ``query``: awaits the embedding request and ranks in a worker thread.
+
+        A ``query_vector`` already computed by ``aembed_query`` is used instead of embedding ``query_text`` again.
+        """
+        logger.info(f"Async querying HyperDB with top_k={top_k}, mode={mode}")
+        self._check_mode(mode)
+        if len(self) == 0:
+            logger.warning("HyperDB is empty, returning no results")
+            return []
+        if mode == "lexical":
+            with stage_timer("search"):
+                rows = await asyncio.to_thread(self._filtered_rows, filter)
+                ranked_results, similarities = await asyncio.to_thread(self._rank_lexical, query_text, top_k, rows)
+            logger.info(f"Found {len(ranked_results)} matching documents")
+            return self._results(ranked_results, similarities, return_similarities)
+            
+        if query_vector is None:
+            query_vector = await self.aembed_query(query_text)
+            if query_vector is None:
+                return []
+            
+        with stage_timer("search"):
+            rows = await asyncio.to_thread(self._filtered_rows, filter)
+            ranked_results, similarities = await asyncio.to_thread(
+                self._rank_mode, mode, query_text, query_vector, top_k, n_probe, ef_search, rows
+            )
+        logger.info(f"Found {len(ranked_results)} similar documents")
+        return self._results(ranked_results, similarities, return_similarities)
+
+    async def aembed_query(self, query_text):
+        """Embed one query as a float32 vector, or return None if the embedding request failed."""
+        with stage_timer("query_embedding"):
+            if self.async_embedding_function is not None:
+                query_embeddings = await self.async_embedding_function([query_text])
+            else:
+                query_embeddings = await asyncio.to_thread(self.embedding_function, [query_text])
+        if not query_embeddings:
+            logger.error("Failed to generate query embedding")
+            return None
+        return np.asarray(query_embeddings[0], dtype=np.float32)
+
+    def query_batch(self, query_texts, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector"):
+        """Rank documents against many queries with one embedding call; returns one result list per query."""
+        logger.info(f"Batch querying HyperDB with {len(query_texts)} queries, top_k={top_k}, mode={mode}")
+        self._check_mode(mode)
+        if not query_texts:
+            return []
+        if len(self) == 0:
+            logger.warning("HyperDB is empty, returning no results")
+            return [[] for _ in query_texts]
+        query_vectors = [None] * len(query_texts)
+        if mode != "lexical":
+            with stage_timer("query_embedding"):
+                query_embeddings = self.embedding_function(list(query_texts))
+            if len(query_embeddings) != len(query_texts):
+                logger.error("Failed to generate query embeddings")
+                return [[] for _ in query_texts]
+            query_vectors = np.asarray(query_embeddings, dtype=np.float32)
+
+        with stage_timer("search"):
+            ranked = self._rank_batch(query_texts, query_vectors, top_k, n_probe, ef_search, self._filtered_rows(filter), mode)
+        logger.info(f"Completed {len(ranked)} batched queries")
+        return [
+            self._results(ranked_results, similarities, return_similarities)
+            for ranked_results, similarities in ranked
+        ]
+
+    def _rank_batch(self, query_texts, query_vectors, top_k, n_probe=None, ef_search=None, rows=None, mode="vector"):
+        if (
+            rows is not None
+            or mode != "vector"
+            or (self.index.size and self.index.name != "flat")
+            or (self.quantizer is not None and self.quantizer.size)
+        ):
+            ranked = [
+                self._rank_mode(mode, query_text, query_vector, top_k, n_probe, ef_search, rows)
+                for query_text, query_vector in zip(query_texts, query_vectors)
+            ]
+        else:
+            # Score blocks of queries with one matrix-matrix product, keeping the
+            # N x block similarity matrix around QUERY_BLOCK_ELEMENTS floats.
+            vectors = self.vectors[:self.current_index]
+            vector_norms = self.get_vector_norms()
+            block_size = max(1, QUERY_BLOCK_ELEMENTS // self.current_index)
+            ranked = []
+            for start in range(0, len(query_vectors), block_size):
+                indices, similarities = hyper_SVM_ranking_algorithm_sort(
+                    vectors,
+                    query_vectors[start:start + block_size],
+                    top_k=top_k + self.deleted_count,
+                    metric=self.similarity_metric,
+                    vector_norms=vector_norms,
+                )
+                ranked.extend(self._drop_deleted(*result, top_k) for result in zip(indices, similarities))
+        return ranked
+
+    def _rank(self, query_vector, top_k, n_probe=None, ef_search=None, rows=None):
+        vectors = self.vectors[:self.current_index]
+        candidates = None
+        if rows is not None:
+            # A metadata filter already narrowed the rows; score all of them exactly
+            candidates = rows
+            if not len(candidates):
+                return candidates, np.empty(0, dtype=np.float32)
+        elif self.index.size:
+            candidates = self.index.search(
+                vectors, query_vector, top_k, n_probe=n_probe, ef_search=ef_search
+            )
+        covered = self.current_index if rows is not None else self.index.size
+        if candidates is None and self.quantizer is not None and self.quantizer.size:
+            candidates = self._quantized_candidates(query_vector, top_k)
+            covered = self.quantizer.size
+        if candidates is not None and covered < self.current_index:
+            # Rows added since the last finalize() are always scanned exactly
+            candidates = np.concatenate([candidates, np.arange(covered, self.current_index)])
+        vector_norms = self.get_vector_norms()
+        if candidates is None:
+            # Ask for enough extra rows that top_k live ones remain after dropping tombstones
+            return self._drop_deleted(*hyper_SVM_ranking_algorithm_sort(
+                vectors,
+                query_vector,
+                top_k=top_k + self.deleted_count,
+                metric=self.similarity_metric,
+                vector_norms=vector_norms,
+            ), top_k)
+        if self.deleted_count:
+            candidates = candidates[~self.deleted[candidates]]
+        if self.quantizer is not None and self.quantizer.size and not self.rerank:
+            candidate_vectors = self._decoded_vectors(candidates)
+            candidate_norms = get_vector_norms(candidate_vectors)
+        else:
+            candidate_vectors = vectors[candidates]
+            candidate_norms = vector_norms[candidates]
         ranked_results, similarities = hyper_SVM_ranking_algorithm_sort(
-            self.vectors[:self.current_index], query_vector, top_k=top_k, metric=self.similarity_metric
+            candidate_vectors,
+            query_vector,
+            top_k=top_k,
+            metric=self.similarity_metric,
+            vector_norms=candidate_norms,
         )
-        logger.info(f"Found {len(ranked_results)} similar documents")
+        return candidates[ranked_results], similarities
+
+    def _rank_mode(self, mode, query_text, query_vector, top_k, n_probe=None, ef_search=None, rows=None):
+        if mode == "lexical":
+            return self._rank_lexical(query_text, top_k, rows)
+        if mode == "hybrid":
+            return self._rank_hybrid(query_text, query_vector, top_k, n_probe, ef_search, rows)
+        return self._rank(query_vector, top_k, n_probe=n_probe, ef_search=ef_search, rows=rows)
+
+    def _rank_lexical(self, query_text, top_k, rows=None, statistics=None):
+        """BM25 ranking; only rows sharing a term with the query are returned.
+
+        ``statistics`` overrides this store's BM25 corpus statistics (see ``ShardedHyperDB``).
+        """
+        self._update_bm25_index()
+        candidates, scores = self.bm25_index.search(str(query_text), statistics)
+        if self.deleted_count:
+            live = ~self.deleted[candidates]
+            candidates, scores = candidates[live], scores[live]
+        if rows is not None:
+            matched = np.isin(candidates, rows, assume_unique=True)
+            candidates, scores = candidates[matched], scores[matched]
+        order = top_k_indices(scores, top_k)
+        return candidates[order], scores[order]
+
+    def _bm25_statistics(self, query_text):
+        self._update_bm25_index()
+        return self.bm25_index.statistics(str(query_text))
+
+    def _rank_hybrid(self, query_text, query_vector, top_k, n_probe=None, ef_search=None, rows=None):
+        """Fuse the vector and BM25 rankings with reciprocal rank fusion."""
+        depth = max(top_k, HYBRID_DEPTH)
+        rankings = [
+            self._rank(query_vector, depth, n_probe=n_probe, ef_search=ef_search, rows=rows)[0].tolist(),
+            self._rank_lexical(query_text, depth, rows)[0].tolist(),
+        ]
+        fused, scores = reciprocal_rank_fusion(rankings, top_k)
+        return np.array(fused, dtype=np.int64), scores
+
+    def _check_mode(self, mode):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode '{mode}'. Please use one of {', '.join(SEARCH_MODES)}.")
+
+    def _filtered_rows(self, filter):
+        """Live rows matching ``filter``, or None to search every row."""
+        if not filter:
+            return None
+        self._update_metadata_index()
+        rows = self.metadata_index.rows(filter)
+        if self.deleted_count:
+            rows = rows[~self.deleted[rows]]
+        logger.info(f"Metadata filter {filter} matched {len(rows)} documents")
+        return rows
+
+    def _update_metadata_index(self):
+        # Rows are indexed lazily, on the first filtered query or save after they were added
+        with self._lazy_index_lock:
+            start = self.metadata_index.size
+            if start < self.current_index:
+                self.metadata_index.add(start, self.documents[start:self.current_index])
+
+    def _update_bm25_index(self):
+        # Like the metadata index, postings are built on the first lexical query or save after rows were added
+        with self._lazy_index_lock:
+            start = self.bm25_index.size
+            if start < self.current_index:
+                self.bm25_index.add(start, self.documents[start:self.current_index])
+
+    def _drop_deleted(self, ranked_results, similarities, top_k):
+        if self.deleted_count:
+            live = ~self.deleted[ranked_results]
+            ranked_results, similarities = ranked_results[live], similarities[live]
+        return ranked_results[:top_k], similarities[:top_k]
+
+    def _quantized_candidates(self, query_vector, top_k):
+        """Shortlist rows by approximate cosine computed against the quantised codes."""
+        similarities = self.quantizer.inner_products(query_vector)
+        similarities /= np.maximum(self.get_vector_norms()[:self.quantizer.size], 1e-12)
+        return top_k_indices(similarities, top_k * QUANTIZED_SHORTLIST_FACTOR)
+
+    def _decoded_vectors(self, candidates):
+        encoded = candidates < self.quantizer.size
+        rows = np.empty((len(candidates), self.vectors.shape[1]), dtype=np.float32)
+        rows[encoded] = self.quantizer.decode(self.quantizer.codes[candidates[encoded]])
+        rows[~encoded] = self.vectors[candidates[~encoded]]
+        return rows
+
+    def _results(self, ranked_results, similarities, return_similarities):
         if return_similarities:
             return list(
                 zip([self.documents[index] for index in ranked_results], similarities)
             )
-        return [self.documents[index] for index in ranked_results]
\ No newline at end of file
+        return [self.documents[index] for index in ranked_results]
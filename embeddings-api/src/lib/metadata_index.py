@@ -0,0 +1,133 @@
+"""Inverted index from document metadata values to HyperDB rows.
+
+Besides ``source`` itself, every source path is indexed by ``file_name``
+(its basename) and ``file_type`` (its extension without the dot), so a
+filter can match a file without knowing where the data directory lives.
+
+Filters map a field to a value for equality, ``{"eq": value}``,
+``{"prefix": value}``, or a list of values to match any of them; several
+fields must all match.
+"""
+import bisect
+import os
+import numpy as np
+
+FIELDS = ("source", "file_name", "file_type")
+
+
+def field_values(document):
+    if not isinstance(document, dict) or not isinstance(document.get("source"), str):
+        return {}
+    source = document["source"]
+    return {
+        "source": source,
+        "file_name": os.path.basename(source),
+        "file_type": os.path.splitext(source)[1].lstrip(".").lower(),
+    }
+
+
+class MetadataIndex:
+    """Posting arrays of row ids per field value, kept sorted so they can be intersected cheaply."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.postings = {field: {} for field in FIELDS}
+        self._sorted_values = {}
+
+    def add(self, start, documents):
+        """Index ``documents`` as rows ``start, start + 1, ...``."""
+        new_rows = {field: {} for field in FIELDS}
+        for row, document in enumerate(documents, start):
+            for field, value in field_values(document).items():
+                new_rows[field].setdefault(value, []).append(row)
+        for field, values in new_rows.items():
+            postings = self.postings[field]
+            for value, rows in values.items():
+                rows = np.array(rows, dtype=np.int64)
+                postings[value] = np.concatenate([postings[value], rows]) if value in postings else rows
+            if values:
+                self._sorted_values.pop(field, None)
+        self.size = start + len(documents)
+
+    def compact(self, keep):
+        """Drop rows where ``keep`` is False and renumber the rest to match a compacted HyperDB."""
+        new_rows = np.cumsum(keep) - 1
+        size = int(np.count_nonzero(keep[:self.size]))
+        for field, postings in self.postings.items():
+            for value in list(postings):
+                rows = postings[value]
+                rows = new_rows[rows[keep[rows]]]
+                if len(rows):
+                    postings[value] = rows
+                else:
+                    del postings[value]
+            self._sorted_values.pop(field, None)
+        self.size = size
+
+    def rows(self, filter):
+        """Sorted rows matching every condition in ``filter``."""
+        matches = None
+        for field, condition in filter.items():
+            if field not in self.postings:
+                raise ValueError(f"Unsupported filter field '{field}'. Please use one of {', '.join(FIELDS)}.")
+            rows = self._match(field, condition)
+            matches = rows if matches is None else np.intersect1d(matches, rows, assume_unique=True)
+            if not len(matches):
+                break
+        if matches is None:
+            return np.arange(self.size, dtype=np.int64)
+        return matches
+
+    def _match(self, field, condition):
+        postings = self.postings[field]
+        if isinstance(condition, dict):
+            if "prefix" in condition:
+                values = self._prefixed(field, condition["prefix"])
+            elif "eq" in condition:
+                values = [condition["eq"]]
+            else:
+                raise ValueError(f"Unsupported filter condition for '{field}': {condition}")
+        elif isinstance(condition, (list, tuple)):
+            values = condition
+        else:
+            values = [condition]
+        rows = [postings[value] for value in values if value in postings]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(rows)) if len(rows) > 1 else rows[0]
+
+    def _prefixed(self, field, prefix):
+        if field not in self._sorted_values:
+            self._sorted_values[field] = sorted(self.postings[field])
+        values = self._sorted_values[field]
+        start = bisect.bisect_left(values, prefix)
+        end = start
+        while end < len(values) and values[end].startswith(prefix):
+            end += 1
+        return values[start:end]
+
+    def info(self):
+        return {"size": self.size, "values": {field: sorted(postings) for field, postings in self.postings.items()}}
+
+    def arrays(self):
+        arrays = {}
+        for field, postings in self.postings.items():
+            values = sorted(postings)
+            lengths = [len(postings[value]) for value in values]
+            arrays[f"meta_{field}_rows"] = (
+                np.concatenate([postings[value] for value in values]) if values else np.empty(0, dtype=np.int64)
+            )
+            arrays[f"meta_{field}_offsets"] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return arrays
+
+    def restore(self, arrays, info):
+        self.reset()
+        for field, values in info["values"].items():
+            rows, offsets = arrays[f"meta_{field}_rows"], arrays[f"meta_{field}_offsets"]
+            self.postings[field] = {
+                value: rows[offsets[i]:offsets[i + 1]] for i, value in enumerate(values)
+            }
+        self.size = info["size"]
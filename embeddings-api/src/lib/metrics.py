@@ -0,0 +1,254 @@
+"""Minimal Prometheus-style metrics rendered in the text exposition format.
+
+Counters, gauges and histograms keep plain Python numbers behind one lock per
+metric, so recording a sample costs about a microsecond on the request path.
+Gauges can instead read their value from a function when ``/metrics`` is
+scraped, which is how cache ratios and the store size are exported.
+"""
+import bisect
+import math
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, label_names=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics record into a single child
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.label_names, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, label_names, values):
+        return [f"{name}{_format_labels(label_names, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from ``function()`` at scrape time instead of storing it."""
+        self.function = function
+
+    def samples(self, name, label_names, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return []
+        return [f"{name}{_format_labels(label_names, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+    _new_child = _GaugeChild
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, label_names, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(label_names, values, [("le", _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(label_names, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(label_names, values)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "embeddings_api_stage_seconds",
+    "Latency of each step of answering a request",
+    ["stage"],
+)
+CONTEXT_CHUNKS = Counter(
+    "embeddings_api_context_chunks_total",
+    "Document chunks retrieved for a prompt and packed into its context",
+    ["kind"],
+)
+CONTEXT_TOKENS = Counter(
+    "embeddings_api_context_tokens_total",
+    "Estimated tokens of retrieved chunks and of the packed context",
+    ["kind"],
+)
+CHAT_TOKENS = Counter(
+    "embeddings_api_chat_tokens_total",
+    "Tokens the chat model evaluated from the prompt and generated, as reported by Ollama",
+    ["kind"],
+)
+OLLAMA_SECONDS = Histogram(
+    "embeddings_api_ollama_seconds",
+    "Time Ollama reports for each chat request: loading the model, evaluating the prompt and generating",
+    ["phase"],
+)
+CHAT_STREAMS = Counter(
+    "embeddings_api_chat_streams_total",
+    "Streamed chat answers by how they ended: completed, cancelled by a client disconnect, or failed",
+    ["outcome"],
+)
+CACHE_HIT_RATIO = Gauge(
+    "embeddings_api_cache_hit_ratio",
+    "Share of cache lookups answered from the cache since startup",
+    ["cache"],
+)
+CACHE_ENTRIES = Gauge(
+    "embeddings_api_cache_entries",
+    "Entries currently held by each cache",
+    ["cache"],
+)
+HYPERDB_DOCUMENTS = Gauge(
+    "embeddings_api_hyperdb_documents",
+    "Live document chunks in the HyperDB store",
+)
+
+
+def stage_timer(stage):
+    """Context manager recording the wrapped block's duration under ``stage``."""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def export_cache_stats(cache_name, cache):
+    """Export ``cache.stats()`` hit ratio and size as gauges read at scrape time."""
+    CACHE_HIT_RATIO.labels(cache_name).set_function(lambda: cache.stats()["hit_ratio"])
+    CACHE_ENTRIES.labels(cache_name).set_function(lambda: cache.stats()["entries"])
@@ -0,0 +1,196 @@
+"""Compressed vector codes for HyperDB.
+
+A quantiser keeps a compact code per row and scores queries against the codes
+with asymmetric distance computation (ADC): the query stays float32 and only
+the corpus side is approximated. Like the ANN indexes, a quantiser only picks
+candidate rows by approximate cosine; HyperDB then scores the candidates with
+its configured metric, on the float32 vectors when re-ranking or on the
+decoded codes otherwise.
+"""
+import numpy as np
+
+# Rows decoded per step while scanning codes, bounding the float32 scratch space
+SCAN_BLOCK_ROWS = 65536
+
+
+class ScalarQuantizer:
+    """int8 scalar quantisation with a per-dimension offset and scale (4x smaller than float32)."""
+
+    name = "sq8"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.offset = None
+        self.scale = None
+        self.codes = None
+
+    def build(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            self.reset()
+            return
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        scale = (high - low) / 255.0
+        scale[scale == 0] = 1.0
+        self.offset = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+        self.codes = self.encode(vectors)
+        self.size = len(vectors)
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return (np.clip(codes, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128.0) * self.scale + self.offset
+
+    def inner_products(self, query_vector):
+        # q.x ~= q.((c + 128) * scale + offset) = c.(q * scale) + q.(128 * scale + offset)
+        weights = query_vector * self.scale
+        bias = float(query_vector @ (128.0 * self.scale + self.offset))
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + SCAN_BLOCK_ROWS]
+            scores[start:start + SCAN_BLOCK_ROWS] = block.astype(np.float32) @ weights
+        scores += bias
+        return scores
+
+    def params(self):
+        return {}
+
+    def arrays(self):
+        return {"sq_offset": self.offset, "sq_scale": self.scale, "sq_codes": self.codes}
+
+    def restore(self, arrays, size):
+        self.offset = arrays["sq_offset"]
+        self.scale = arrays["sq_scale"]
+        self.codes = arrays["sq_codes"]
+        self.size = size
+
+    def compact(self, keep):
+        self.codes = self.codes[keep]
+        self.size = len(self.codes)
+
+
+class ProductQuantizer:
+    """Product quantisation: each of ``m`` subvectors is replaced by the id of one of 256 k-means centroids.
+
+    ``m`` defaults to a quarter of the dimension, i.e. one byte per four floats (16x smaller).
+    """
+
+    name = "pq"
+
+    def __init__(self, m=None, n_iter=15, sample_size=20000, seed=0):
+        self.m = m
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.codebooks = None
+        self.codes = None
+
+    def _subspaces(self, dim):
+        m = self.m or max(1, dim // 4)
+        # Fall back to the nearest smaller divisor so subvectors stay equal-sized
+        while dim % m:
+            m -= 1
+        return m
+
+    def build(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n == 0:
+            self.reset()
+            return
+        m = self._subspaces(vectors.shape[1])
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(n, min(n, self.sample_size), replace=False)]
+        sample = sample.reshape(len(sample), m, -1)
+        n_centroids = min(256, len(sample))
+
+        codebooks = []
+        for j in range(m):
+            points = sample[:, j]
+            centroids = points[rng.choice(len(points), n_centroids, replace=False)]
+            for _ in range(self.n_iter):
+                assignments = self._assign(points, centroids)
+                counts = np.bincount(assignments, minlength=n_centroids)
+                filled = counts > 0
+                sums = np.stack(
+                    [np.bincount(assignments, weights=points[:, d], minlength=n_centroids) for d in range(points.shape[1])],
+                    axis=1,
+                )
+                centroids = centroids.copy()
+                centroids[filled] = (sums[filled] / counts[filled, np.newaxis]).astype(np.float32)
+                # Re-seed empty centroids from random sample points
+                if not filled.all():
+                    centroids[~filled] = points[rng.choice(len(points), int((~filled).sum()))]
+            codebooks.append(centroids)
+        self.codebooks = np.stack(codebooks).astype(np.float32)
+        self.codes = self.encode(vectors)
+        self.size = n
+
+    @staticmethod
+    def _assign(points, centroids):
+        distances = -2 * points @ centroids.T
+        distances += np.sum(centroids * centroids, axis=1)
+        return np.argmin(distances, axis=1)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        m = len(self.codebooks)
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS].reshape(-1, m, vectors.shape[1] // m)
+            for j in range(m):
+                codes[start:start + SCAN_BLOCK_ROWS, j] = self._assign(block[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        m = len(self.codebooks)
+        return self.codebooks[np.arange(m), codes].reshape(len(codes), -1)
+
+    def inner_products(self, query_vector):
+        m, n_centroids, _ = self.codebooks.shape
+        # One lookup table per subspace, then each row's score is a sum of m table entries
+        table = np.einsum("mkd,md->mk", self.codebooks, query_vector.reshape(m, -1)).ravel()
+        offsets = np.arange(m) * n_centroids
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + SCAN_BLOCK_ROWS]
+            scores[start:start + SCAN_BLOCK_ROWS] = table[block + offsets].sum(axis=1)
+        return scores
+
+    def params(self):
+        return {"m": self.m, "n_iter": self.n_iter, "sample_size": self.sample_size, "seed": self.seed}
+
+    def arrays(self):
+        return {"pq_codebooks": self.codebooks, "pq_codes": self.codes}
+
+    def restore(self, arrays, size):
+        self.codebooks = arrays["pq_codebooks"]
+        self.codes = arrays["pq_codes"]
+        self.size = size
+
+    def compact(self, keep):
+        self.codes = self.codes[keep]
+        self.size = len(self.codes)
+
+
+QUANTIZER_TYPES = {quantizer.name: quantizer for quantizer in (ScalarQuantizer, ProductQuantizer)}
+
+
+def create_quantizer(quantization, **params):
+    if quantization in (None, "none"):
+        return None
+    if quantization not in QUANTIZER_TYPES:
+        raise Exception(
+            f"Quantization type not supported. Please use 'none' or one of {', '.join(repr(name) for name in QUANTIZER_TYPES)}."
+        )
+    return QUANTIZER_TYPES[quantization](**params)
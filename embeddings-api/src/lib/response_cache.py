@@ -0,0 +1,146 @@
+"""In-memory cache of chat answers with an exact tier and an optional semantic tier.
+
+The exact tier is keyed on the chat model and the assembled prompt with
+whitespace normalised. The semantic tier groups answers by a scope (model,
+flags, filter and everything in the conversation before the last question)
+and serves one when the new question's embedding is close enough to a cached
+question's embedding within the same scope.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    return WHITESPACE_PATTERN.sub(" ", str(text)).strip()
+
+
+def prompt_key(model, messages):
+    """Exact-tier key for the prompt ``messages`` sent to ``model``."""
+    return _digest([model] + [[message.get("role", ""), normalize_text(message.get("content", ""))] for message in messages])
+
+
+def semantic_scope(model, conversation, *options):
+    """Semantic-tier scope: answers are only shared between questions asked after the same conversation."""
+    return _digest([model, list(options)] + [
+        [message.get("role", ""), normalize_text(message.get("content", ""))] for message in conversation[:-1]
+    ])
+
+
+class ResponseCache:
+    """LRU cache of answers bounded by entry count and age; ``generation`` changes drop every entry."""
+
+    def __init__(self, max_entries=1000, ttl=3600, semantic_threshold=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.generation = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._lock = threading.Lock()
+
+    def sync(self, generation):
+        """Invalidate every entry when the index the answers were grounded in has changed."""
+        with self._lock:
+            if generation != self.generation:
+                if self._entries:
+                    logger.info(f"Index changed, dropping {len(self._entries)} cached responses")
+                self._entries.clear()
+                self._scopes.clear()
+                self.generation = generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def get_similar(self, scope, vector):
+        """Return the answer to the closest cached question in ``scope`` above the threshold, or None."""
+        if not self.semantic_threshold or vector is None:
+            return None
+        unit = _unit(vector)
+        with self._lock:
+            best_key, best_similarity = None, self.semantic_threshold
+            for key, cached_unit in list(self._scopes.get(scope, {}).items()):
+                if self._live_entry(key) is None:
+                    continue
+                similarity = float(cached_unit @ unit)
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+            if best_key is None:
+                return None
+            self.semantic_hits += 1
+            logger.info(f"Semantic response cache hit with similarity {best_similarity:.3f}")
+            return self._entries[best_key][0]
+
+    def put(self, key, response, scope=None, vector=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response, time.monotonic(), scope)
+            if scope is not None and vector is not None and self.semantic_threshold:
+                self._scopes.setdefault(scope, {})[key] = _unit(vector)
+            self._evict()
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl and time.monotonic() - entry[1] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        _, _, scope = self._entries.pop(key)
+        vectors = self._scopes.get(scope)
+        if vectors is not None:
+            vectors.pop(key, None)
+            if not vectors:
+                del self._scopes[scope]
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (_, stored_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and not (self.ttl and now - stored_at > self.ttl):
+                break
+            self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
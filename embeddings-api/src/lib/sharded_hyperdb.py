@@ -0,0 +1,328 @@
+"""HyperDB partitioned into shards that are searched in parallel.
+
+Each shard is a complete ``HyperDB`` with its own memory-mapped store
+directory (``shard-000/``, ``shard-001/``, ...) next to a small
+``shards.json`` manifest. A query is embedded once, ranked on every shard in
+a thread pool (the NumPy scans release the GIL, so shards run on separate
+cores while sharing the page cache) and the per-shard top-k lists are merged.
+Lexical scores use BM25 statistics summed over all shards, and hybrid search
+fuses the merged rankings, so results match an unsharded store.
+
+Document ids are global: ``local_id * n_shards + shard``. A shard is only
+re-indexed and rewritten when its own rows changed.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .hyperdb import HYBRID_DEPTH, HyperDB, reciprocal_rank_fusion
+from .bm25_index import combine_statistics
+from . import storage
+from .galaxy_brain_math import top_k_indices
+from .metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "shards.json"
+FORMAT_NAME = "hyperdb-shards"
+FORMAT_VERSION = 1
+
+
+def is_sharded_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def shard_path(path, shard):
+    return os.path.join(path, f"shard-{shard:03d}")
+
+
+def store_version(path):
+    """Changes whenever the shard manifest is rewritten, i.e. after every save."""
+    try:
+        return os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def store_size(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        shards = json.load(f)["shards"]
+    return sum(storage.store_size(shard_path(path, shard)) for shard in range(shards))
+
+
+class ShardedHyperDB:
+    """Drop-in replacement for ``HyperDB`` that fans every query out over ``n_shards`` shards."""
+
+    def __init__(self, documents=None, vectors=None, n_shards=4, search_threads=None, key=None, embedding_function=None, **db_options):
+        if n_shards < 1:
+            raise ValueError("ShardedHyperDB needs at least one shard")
+        logger.info(f"Initializing ShardedHyperDB with {n_shards} shards")
+        self.db_options = dict(db_options, key=key, embedding_function=embedding_function)
+        self.shards = [self._new_shard() for _ in range(n_shards)]
+        self.metadata = {}
+        self.storage_file = None
+        self._dirty = set(range(n_shards))
+        self.executor = ThreadPoolExecutor(
+            max_workers=search_threads or min(n_shards, os.cpu_count() or 1),
+            thread_name_prefix="hyperdb-shard",
+        )
+        self.embedding_function = self.shards[0].embedding_function
+        self.async_embedding_function = self.shards[0].async_embedding_function
+        if documents:
+            self.add_documents(documents, vectors)
+
+    def _new_shard(self):
+        # An empty (0, 0) matrix skips the dimension probe; the first append allocates rows
+        return HyperDB(vectors=np.empty((0, 0), dtype=np.float32), **self.db_options)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    @property
+    def n_shards(self):
+        return len(self.shards)
+
+    def _map(self, function, shards=None):
+        """Run ``function(shard_number, shard)`` on every shard in the pool and return results in shard order."""
+        shards = range(self.n_shards) if shards is None else shards
+        return list(self.executor.map(lambda i: function(i, self.shards[i]), shards))
+
+    def _global_ids(self, shard, local_ids):
+        return [local_id * self.n_shards + shard for local_id in local_ids]
+
+    def items(self):
+        """Yield ``(doc_id, document, vector)`` for every live row, shard by shard."""
+        for i, shard in enumerate(self.shards):
+            for local_id, document, vector in shard.items():
+                yield local_id * self.n_shards + i, document, vector
+
+    def add(self, documents, vectors=None):
+        if not isinstance(documents, list):
+            vectors = None if vectors is None else [vectors]
+            ids = self.add_documents([documents], vectors)
+            return ids[0] if ids else None
+        return self.add_documents(documents, vectors)
+
+    def add_documents(self, documents, vectors=None):
+        """Spread documents over the shards, filling the smallest first, and return their global ids."""
+        if not documents:
+            return []
+        if vectors is None:
+            vectors = self.embedding_function(documents)
+            if not vectors:
+                logging.warning("Failed to generate embeddings for documents")
+                return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        # Split the batch into contiguous parts so each shard gets one slice append
+        ids = [None] * len(documents)
+        order = sorted(range(self.n_shards), key=lambda i: self.shards[i].current_index)
+        bounds = np.linspace(0, len(documents), self.n_shards + 1).astype(int)
+        for i, start, end in zip(order, bounds[:-1], bounds[1:]):
+            if start == end:
+                continue
+            local_ids = self.shards[i].add_documents(documents[start:end], vectors[start:end])
+            ids[start:end] = self._global_ids(i, local_ids)
+            self._dirty.add(i)
+        return ids
+
+    def remove_document(self, doc_id, compact=True):
+        shard = doc_id % self.n_shards
+        self.shards[shard].remove_document(doc_id // self.n_shards, compact=compact)
+        self._dirty.add(shard)
+
+    def finalize(self, shards=None):
+        """Compact and re-index the changed shards (or the given ones) in parallel."""
+        shards = sorted(self._dirty) if shards is None else shards
+        self._map(lambda i, shard: shard.finalize(), shards)
+
+    def rebuild_shard(self, shard):
+        """Re-index one shard from its rows and write it back, leaving the others untouched."""
+        self.shards[shard].finalize()
+        if self.storage_file is not None:
+            self.shards[shard].save(shard_path(self.storage_file, shard))
+            self._dirty.discard(shard)
+
+    def save(self, storage_file, dtype="float32", metadata=None):
+        """Write changed shards and the shard manifest; every shard is written when saving to a new path."""
+        if metadata is not None:
+            self.metadata = metadata
+        shards = sorted(self._dirty) if storage_file == self.storage_file else range(self.n_shards)
+        os.makedirs(storage_file, exist_ok=True)
+        logger.info(f"Saving {len(shards)} of {self.n_shards} shards to {storage_file}")
+        self._map(lambda i, shard: shard.save(shard_path(storage_file, i), dtype=dtype), shards)
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "shards": self.n_shards,
+            "metadata": self.metadata,
+        }
+        fd, tmp_file = tempfile.mkstemp(prefix=f"{MANIFEST_FILE}.", dir=storage_file)
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_file, os.path.join(storage_file, MANIFEST_FILE))
+        self.storage_file = storage_file
+        self._dirty = set()
+
+    def load(self, storage_file):
+        """Memory-map every shard store listed in the manifest."""
+        with open(os.path.join(storage_file, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_NAME:
+            raise ValueError(f"{storage_file} is not a sharded HyperDB store.")
+        if manifest["shards"] != self.n_shards:
+            logger.info(f"Store has {manifest['shards']} shards, using that instead of {self.n_shards}")
+            self.shards = [self._new_shard() for _ in range(manifest["shards"])]
+        self._map(lambda i, shard: shard.load(shard_path(storage_file, i)))
+        self.metadata = manifest.get("metadata", {})
+        self.storage_file = storage_file
+        self._dirty = set()
+        logger.info(f"Loaded {len(self)} documents from {self.n_shards} shards")
+
+    @classmethod
+    def from_storage(cls, storage_file, **kwargs):
+        db = cls(**kwargs)
+        db.load(storage_file)
+        return db
+
+    def query(self, query_text, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector"):
+        """Same as ``HyperDB.query``, with BM25 statistics summed over every shard."""
+        logger.info(f"Querying {self.n_shards} shards with top_k={top_k}, mode={mode}")
+        self.shards[0]._check_mode(mode)
+        if len(self) == 0:
+            logger.warning("ShardedHyperDB is empty, returning no results")
+            return []
+        query_vector = None
+        if mode != "lexical":
+            with stage_timer("query_embedding"):
+                query_embeddings = self.embedding_function([query_text])
+            if not query_embeddings:
+                logger.error("Failed to generate query embedding")
+                return []
+            query_vector = np.asarray(query_embeddings[0], dtype=np.float32)
+        return self._search(query_text, query_vector, top_k, n_probe, ef_search, filter, mode, return_similarities)
+
+    async def aquery(self, query_text, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector", query_vector=None):
+        """Async ``query``: awaits the embedding request and fans out from a worker thread."""
+        self.shards[0]._check_mode(mode)
+        if len(self) == 0:
+            logger.warning("ShardedHyperDB is empty, returning no results")
+            return []
+        if mode != "lexical" and query_vector is None:
+            query_vector = await self.aembed_query(query_text)
+            if query_vector is None:
+                return []
+        return await asyncio.to_thread(
+            self._search, query_text, query_vector, top_k, n_probe, ef_search, filter, mode, return_similarities
+        )
+
+    async def aembed_query(self, query_text):
+        return await self.shards[0].aembed_query(query_text)
+
+    def query_batch(self, query_texts, top_k=5, return_similarities=True, n_probe=None, ef_search=None, filter=None, mode="vector"):
+        """Rank many queries with one embedding call; each shard scores the whole batch at once."""
+        logger.info(f"Batch querying {self.n_shards} shards with {len(query_texts)} queries, top_k={top_k}, mode={mode}")
+        self.shards[0]._check_mode(mode)
+        if not query_texts:
+            return []
+        if len(self) == 0:
+            logger.warning("ShardedHyperDB is empty, returning no results")
+            return [[] for _ in query_texts]
+        query_vectors = [None] * len(query_texts)
+        if mode != "lexical":
+            with stage_timer("query_embedding"):
+                query_embeddings = self.embedding_function(list(query_texts))
+            if len(query_embeddings) != len(query_texts):
+                logger.error("Failed to generate query embeddings")
+                return [[] for _ in query_texts]
+            query_vectors = np.asarray(query_embeddings, dtype=np.float32)
+
+        with stage_timer("search"):
+            if mode != "vector":
+                filtered = self._map(lambda i, shard: shard._filtered_rows(filter))
+                return [
+                    self._documents(*self._rank_shards(query_text, query_vector, top_k, n_probe, ef_search, filtered, mode), return_similarities)
+                    for query_text, query_vector in zip(query_texts, query_vectors)
+                ]
+
+            def rank(i, shard):
+                if not len(shard):
+                    return None
+                return shard._rank_batch(query_texts, query_vectors, top_k, n_probe, ef_search, shard._filtered_rows(filter), mode)
+
+            per_shard = self._map(rank)
+            return [
+                self._documents(*self._merge([ranked and ranked[q] for ranked in per_shard], top_k), return_similarities)
+                for q in range(len(query_texts))
+            ]
+
+    def _search(self, query_text, query_vector, top_k, n_probe, ef_search, filter, mode, return_similarities):
+        with stage_timer("search"):
+            filtered = self._map(lambda i, shard: shard._filtered_rows(filter))
+            results = self._documents(
+                *self._rank_shards(query_text, query_vector, top_k, n_probe, ef_search, filtered, mode), return_similarities
+            )
+        logger.info(f"Found {len(results)} similar documents")
+        return results
+
+    def _rank_shards(self, query_text, query_vector, top_k, n_probe, ef_search, filtered, mode):
+        """Global ``(shard_ids, rows, scores)`` for one query, best first.
+
+        BM25 scores use document counts, lengths and frequencies summed over
+        every shard so they compare across shards, and hybrid search fuses the
+        merged vector and lexical rankings once instead of per shard.
+        """
+        statistics = None
+        if mode != "vector":
+            statistics = combine_statistics(self._map(lambda i, shard: shard._bm25_statistics(query_text)))
+
+        def rank_vector(depth):
+            return self._merge(self._map(
+                lambda i, shard: shard._rank(query_vector, depth, n_probe=n_probe, ef_search=ef_search, rows=filtered[i])
+                if len(shard) else None
+            ), depth)
+
+        def rank_lexical(depth):
+            return self._merge(self._map(
+                lambda i, shard: shard._rank_lexical(query_text, depth, filtered[i], statistics) if len(shard) else None
+            ), depth)
+
+        if mode == "vector":
+            return rank_vector(top_k)
+        if mode == "lexical":
+            return rank_lexical(top_k)
+        depth = max(top_k, HYBRID_DEPTH)
+        rankings = [list(zip(ranked[0].tolist(), ranked[1].tolist())) for ranked in (rank_vector(depth), rank_lexical(depth))]
+        fused, scores = reciprocal_rank_fusion(rankings, top_k)
+        if not fused:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), scores
+        shard_ids, rows = (np.array(column, dtype=np.int64) for column in zip(*fused))
+        return shard_ids, rows, scores
+
+    def _merge(self, per_shard, top_k):
+        """Merge per-shard ``(rows, scores)`` into a global top-k ``(shard_ids, rows, scores)``, best first."""
+        shard_ids, rows, scores = [], [], []
+        for i, ranked in enumerate(per_shard):
+            if ranked is None or not len(ranked[0]):
+                continue
+            shard_ids.append(np.full(len(ranked[0]), i))
+            rows.append(ranked[0])
+            scores.append(np.asarray(ranked[1], dtype=np.float32))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        shard_ids, rows, scores = np.concatenate(shard_ids), np.concatenate(rows), np.concatenate(scores)
+        best = top_k_indices(scores, top_k)
+        return shard_ids[best], rows[best], scores[best]
+
+    def _documents(self, shard_ids, rows, scores, return_similarities):
+        documents = [self.shards[shard].documents[row] for shard, row in zip(shard_ids.tolist(), rows.tolist())]
+        if return_similarities:
+            return list(zip(documents, scores))
+        return documents
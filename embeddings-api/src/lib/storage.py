@@ -0,0 +1,241 @@
+"""Versioned on-disk layout for HyperDB.
+
+A store is a directory holding a raw vector matrix that is opened with
+``np.memmap`` and an offset-indexed JSON-lines document file, so several
+API workers can share the same page-cache pages instead of each unpickling
+its own copy of the corpus.
+
+Each save writes a complete ``v-*`` subdirectory under the store path and
+publishes it by ``os.replace``-ing the ``CURRENT`` pointer file, so readers
+see either the previous version or the new one, never a partial store.
+Stores written before the pointer existed keep their files directly in the
+store path and are still read from there.
+"""
+import contextlib
+import fcntl
+import gzip
+import json
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+
+FORMAT_NAME = "hyperdb"
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "v-"
+TMP_PREFIX = "tmp-"
+# Unpublished directories older than this were left by a writer that crashed
+STALE_TMP_SECONDS = 3600
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.bin"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "documents.idx"
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+class DocumentStore:
+    """Read-only, lazily decoded view over an offset-indexed document file."""
+
+    def __init__(self, documents_file, offsets_file):
+        self.offsets = np.load(offsets_file, mmap_mode="r")
+        self._file = None
+        self._data = b""
+        if os.path.getsize(documents_file) > 0:
+            self._file = open(documents_file, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return json.loads(self._data[start:end])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        """Unmap the document file and its offsets; the store reads as empty afterwards."""
+        if self._file is not None:
+            self._data.close()
+            self._file.close()
+            self._file = None
+        self._data = b""
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+
+def resolve_store(path):
+    """Directory holding the published version of the store at ``path``, or None if there is none."""
+    old_path = f"{path}.old"
+    if not os.path.exists(path) and os.path.isfile(os.path.join(old_path, MANIFEST_FILE)):
+        # An earlier layout swapped stores with two renames; finish an interrupted swap
+        with contextlib.suppress(OSError):
+            os.rename(old_path, path)
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return path if os.path.isfile(os.path.join(path, MANIFEST_FILE)) else None
+    return os.path.join(path, version)
+
+
+def is_store(path):
+    return resolve_store(path) is not None
+
+
+def store_version(path):
+    """Changes whenever a new version of the store is published."""
+    for name in (CURRENT_FILE, MANIFEST_FILE):
+        with contextlib.suppress(FileNotFoundError):
+            return os.stat(os.path.join(path, name)).st_mtime_ns
+    return None
+
+
+@contextlib.contextmanager
+def store_lock(path):
+    """Exclusive lock on ``path`` shared by every process on the host, held for the ``with`` block."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_store(path, vectors, documents, dtype="float32", extra=None, arrays=None):
+    """Write vectors, documents and auxiliary arrays as a new version of ``path`` and publish it atomically."""
+    dtype = np.dtype(dtype).name
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported vector dtype '{dtype}'. Please use one of {SUPPORTED_DTYPES}.")
+
+    vectors = np.asarray(vectors)
+    os.makedirs(path, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=path)
+
+    vectors_on_disk = np.ascontiguousarray(vectors, dtype=dtype)
+    vectors_on_disk.tofile(os.path.join(tmp_path, VECTORS_FILE))
+
+    offsets = np.zeros(len(documents) + 1, dtype=np.uint64)
+    with open(os.path.join(tmp_path, DOCUMENTS_FILE), "wb") as f:
+        position = 0
+        for i, document in enumerate(documents):
+            line = json.dumps(document, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            position += len(line)
+            offsets[i + 1] = position
+    with open(os.path.join(tmp_path, OFFSETS_FILE), "wb") as f:
+        np.save(f, offsets)
+
+    arrays = arrays or {}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(array))
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "count": len(documents),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "dtype": dtype,
+        "arrays": sorted(arrays),
+    }
+    manifest.update(extra or {})
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _publish(path, tmp_path)
+    return manifest
+
+
+def _publish(path, tmp_path):
+    previous = resolve_store(path)
+    version = VERSION_PREFIX + os.path.basename(tmp_path)[len(TMP_PREFIX):]
+    os.rename(tmp_path, os.path.join(path, version))
+    fd, pointer = tempfile.mkstemp(prefix=f"{CURRENT_FILE}.", dir=path)
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(path, CURRENT_FILE))
+
+    # The version just replaced stays for readers that resolved it a moment ago;
+    # readers that already memory-mapped older files keep their pages after removal.
+    keep = {version, CURRENT_FILE, os.path.basename(previous) if previous else None}
+    now = time.time()
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if name in keep:
+            continue
+        if name.startswith(TMP_PREFIX) or name.startswith(f"{CURRENT_FILE}."):
+            with contextlib.suppress(FileNotFoundError):
+                if now - os.path.getmtime(entry) < STALE_TMP_SECONDS:
+                    continue
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        elif previous != path:
+            # Files of a store in the earlier flat layout are kept for one version, like a v-* directory
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry)
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a HyperDB store.")
+    if manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(
+            f"HyperDB store version {manifest['version']} is newer than supported version {FORMAT_VERSION}."
+        )
+    return manifest
+
+
+def read_store(path):
+    """Open a store without copying it; returns ``(vectors, documents, manifest)``."""
+    manifest = read_manifest(path)
+    count, dim = manifest["count"], manifest["dim"]
+    if count == 0:
+        vectors = np.empty((0, dim), dtype=manifest["dtype"])
+    else:
+        vectors = np.memmap(
+            os.path.join(path, VECTORS_FILE), dtype=manifest["dtype"], mode="r", shape=(count, dim)
+        )
+    documents = DocumentStore(
+        os.path.join(path, DOCUMENTS_FILE), os.path.join(path, OFFSETS_FILE)
+    )
+    return vectors, documents, manifest
+
+
+def read_arrays(path, manifest):
+    """Memory-map the auxiliary arrays listed in the manifest."""
+    return {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in manifest.get("arrays", [])
+    }
+
+
+def read_legacy_pickle(storage_file):
+    """Read a pre-v1 ``.pickle.gz`` file; returns ``(vectors, documents)``."""
+    with gzip.open(storage_file, "rb") as f:
+        data = pickle.load(f)
+    return data["vectors"].astype(np.float32), data["documents"]
+
+
+def store_size(path):
+    path = resolve_store(path) or path
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name))
+    )
@@ -0,0 +1,94 @@
+"""In-memory rolling conversation summaries keyed by a hash of the message prefix."""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def prefix_hashes(messages):
+    """Chained hashes so ``hashes[i]`` identifies ``messages[:i + 1]`` without rehashing the prefix."""
+    hashes = []
+    digest = b""
+    for message in messages:
+        payload = json.dumps(
+            {"role": message.get("role", ""), "content": message.get("content", "")},
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode("utf-8")
+        digest = hashlib.sha256(digest + payload).digest()
+        hashes.append(digest.hex())
+    return hashes
+
+
+class SummaryCache:
+    """LRU cache of conversation summaries bounded by total summary size and entry age."""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=3600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def longest_prefix(self, hashes):
+        """Return ``(length, summary)`` for the longest cached prefix, or ``(0, None)``."""
+        now = time.monotonic()
+        with self._lock:
+            for length in range(len(hashes), 0, -1):
+                entry = self._entries.get(hashes[length - 1])
+                if entry is None:
+                    continue
+                summary, stored_at = entry
+                if self.ttl and now - stored_at > self.ttl:
+                    self._remove(hashes[length - 1])
+                    continue
+                self._entries.move_to_end(hashes[length - 1])
+                self.hits += 1
+                return length, summary
+            self.misses += 1
+            return 0, None
+
+    def put(self, key, summary):
+        size = len(summary.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (summary, time.monotonic())
+            self.size += size
+            self._evict()
+
+    def _remove(self, key):
+        summary, _ = self._entries.pop(key)
+        self.size -= len(summary.encode("utf-8"))
+
+    def _evict(self):
+        now = time.monotonic()
+        evicted = 0
+        while self._entries:
+            key, (_, stored_at) = next(iter(self._entries.items()))
+            if self.size <= self.max_bytes and not (self.ttl and now - stored_at > self.ttl):
+                break
+            self._remove(key)
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} conversation summaries from cache")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
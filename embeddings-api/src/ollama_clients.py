@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import httpx
+from ollama import AsyncClient, Client
+from .global_config import GlobalConfig
+
+# Same instruction prefix langchain's OllamaEmbeddings adds, so stored vectors stay comparable
+EMBED_INSTRUCTION = "passage: "
+
+# Connections to the chat model; Ollama queues requests beyond its OLLAMA_NUM_PARALLEL anyway
+CHAT_MAX_CONNECTIONS = 16
+CHAT_TIMEOUT = 300.0
+
+class PooledOllamaClient:
+    """Ollama sync client plus one async client per event loop, sharing keep-alive connection pools"""
+
+    def __init__(self, base_url, max_connections=4, timeout=120.0):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._async_clients = {}
+        self.client = Client(
+            host=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def async_client(self):
+        # httpx async pools are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = AsyncClient(
+                host=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                ),
+            )
+        return self._async_clients[loop]
+
+    async def aclose(self):
+        """Close the sync pool and the async pool of the running loop; pools of other loops die with them"""
+        self.client._client.close()
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client._client.aclose()
+
+class PooledOllamaEmbeddings(PooledOllamaClient):
+    """Drop-in for OllamaEmbeddings.embed_documents that reuses one keep-alive connection pool"""
+
+    def __init__(self, model, base_url, max_connections=4, timeout=120.0):
+        super().__init__(base_url, max_connections=max_connections, timeout=timeout)
+        self.model = model
+
+    def embed_documents(self, texts):
+        return [
+            self.client.embeddings(model=self.model, prompt=f"{EMBED_INSTRUCTION}{text}")["embedding"]
+            for text in texts
+        ]
+
+    async def aembed_documents(self, texts):
+        client = self.async_client()
+        semaphore = asyncio.Semaphore(self.max_connections)
+
+        async def embed(text):
+            async with semaphore:
+                response = await client.embeddings(model=self.model, prompt=f"{EMBED_INSTRUCTION}{text}")
+                return response["embedding"]
+
+        return await asyncio.gather(*(embed(text) for text in texts))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_embeddings_client():
+    """Process-wide pooled embeddings client for the configured model"""
+    config = GlobalConfig()
+    key = ("embeddings", config.ollama_embeddings_model, config.ollama_base_url)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = PooledOllamaEmbeddings(
+                model=config.ollama_embeddings_model,
+                base_url=config.ollama_base_url,
+                max_connections=config.embedding_concurrency,
+            )
+        return _clients[key]
+
+def get_chat_client():
+    """Process-wide pooled client for chat and summary requests to the chat model"""
+    config = GlobalConfig()
+    key = ("chat", config.ollama_chat_model, config.ollama_base_url)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = PooledOllamaClient(
+                base_url=config.ollama_base_url, max_connections=CHAT_MAX_CONNECTIONS, timeout=CHAT_TIMEOUT
+            )
+        return _clients[key]
+
+async def aclose_clients():
+    """Close every pooled client; the next get_*_client call opens a new one"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.aclose()
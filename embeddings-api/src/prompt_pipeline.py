@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import time
+from .global_config import GlobalConfig
+from .lib.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful AI assistant. Use any provided context to answer questions accurately and remember details from the conversation."
+}
+
+class PromptPipeline:
+    """Assembles the chat prompt, running the history summary and document retrieval side by side"""
+
+    def __init__(self, vector_search_api, summarizer):
+        config = GlobalConfig()
+        self.vector_search_api = vector_search_api
+        self.summarizer = summarizer
+        self.summary_timeout = config.summary_timeout
+        self.retrieval_timeout = config.retrieval_timeout
+
+    def parse_request(self, query):
+        """Returns ``(conversation, retrieve_embeddings, include_history_summary, filter)`` from a /chat body"""
+        if isinstance(query["text"], str):
+            # Legacy format support
+            parsed_data = json.loads(query["text"])
+            return parsed_data["messages"], True, True, None
+        # New format with flags
+        return (
+            query["text"]["messages"],
+            query["text"].get("retrieve_embeddings", True),
+            query["text"].get("include_history_summary", True),
+            query["text"].get("filter"),
+        )
+
+    async def build_messages(self, query, query_vector=None, skipped_stages=None):
+        """Assemble the prompt messages; ``query_vector`` is an embedding of the last user prompt to reuse for retrieval
+
+        Stages that timed out or failed are appended by name to ``skipped_stages`` if it is given.
+        """
+        conversation, retrieve_embeddings, include_history_summary, filter = self.parse_request(query)
+
+        # Extract conversation components
+        system_messages = [msg for msg in conversation if msg["role"] == "system"]
+        user_messages = [msg for msg in conversation if msg["role"] == "user"]
+
+        # Get the last user prompt
+        last_user_prompt = user_messages[-1] if user_messages else {"role": "user", "content": ""}
+
+        # Build conversation history (excluding the last user message)
+        conversation_history = [
+            message for message in conversation[:-1] if message["role"] in ["user", "assistant"]
+        ]
+
+        summary_task = None
+        if include_history_summary and conversation_history:
+            summary_task = self._run_stage(
+                "summary", self.summarizer.asummarize(conversation_history), self.summary_timeout, skipped_stages
+            )
+        retrieval_task = None
+        if retrieve_embeddings:
+            retrieval_task = self._run_stage(
+                "retrieval",
+                self.vector_search_api.aget_embeddings(last_user_prompt, filter=filter, query_vector=query_vector),
+                self.retrieval_timeout,
+                skipped_stages,
+            )
+        summarized_conversation, embeddings = await asyncio.gather(
+            summary_task or _none(), retrieval_task or _none()
+        )
+
+        # Most stable parts first: Ollama only re-evaluates the prompt after the prefix it shares with the previous request
+        messages = [system_messages[0] if system_messages else DEFAULT_SYSTEM_MESSAGE]
+        if summarized_conversation:
+            messages.append({
+                "role": "user",
+                "content": f"Previous conversation summary: {summarized_conversation}"
+            })
+        if embeddings:
+            combined_context = "\n\n".join(embeddings)
+            messages.append({
+                "role": "user",
+                "content": f"Document context: {combined_context}"
+            })
+
+        # Add the current user prompt
+        messages.append(last_user_prompt)
+        return messages
+
+    async def _run_stage(self, name, coroutine, timeout, skipped_stages=None):
+        """Await one stage; a timeout or failure skips it instead of failing the request"""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coroutine, timeout=timeout) if timeout else await coroutine
+        except asyncio.TimeoutError:
+            logger.warning(f"Prompt stage '{name}' timed out after {timeout}s, skipping it")
+            if skipped_stages is not None:
+                skipped_stages.append(name)
+            return None
+        except Exception as e:
+            logger.error(f"Prompt stage '{name}' failed, skipping it: {e}")
+            if skipped_stages is not None:
+                skipped_stages.append(name)
+            return None
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        logger.info(f"Prompt stage '{name}' finished in {elapsed:.3f}s")
+        return result
+
+async def _none():
+    return None
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from starlette.concurrency import run_in_threadpool
+from .global_config import GlobalConfig, Singleton
+from .vector_search_api import VectorSearchAPI
+from .summarizer import Summarizer
+from .chat_completion import ChatCompletion
+from .prompt_pipeline import PromptPipeline
+from .ollama_clients import aclose_clients
+from .lib.response_cache import ResponseCache
+from .lib.metrics import HYPERDB_DOCUMENTS, export_cache_stats
+
+logger = logging.getLogger(__name__)
+
+class Services(metaclass=Singleton):
+    """Application-scoped services shared by every router
+
+    Building it does no I/O: the embeddings store is opened and brought up to
+    date by ``start()`` on a worker thread, and ``vector_search_api.ready``
+    tells when it can be searched. Ollama connections are pooled per model in
+    ``ollama_clients`` and closed by ``stop()``.
+    """
+
+    def __init__(self):
+        config = GlobalConfig()
+        self.vector_search_api = VectorSearchAPI(load=False)
+        self.summarizer = Summarizer()
+        self.chat_completion = ChatCompletion()
+        self.prompt_pipeline = PromptPipeline(self.vector_search_api, self.summarizer)
+        self.response_cache = ResponseCache(
+            max_entries=config.response_cache_max_entries,
+            ttl=config.response_cache_ttl,
+            semantic_threshold=config.response_cache_semantic_threshold,
+        ) if config.response_cache_max_entries > 0 else None
+        if self.response_cache is not None:
+            export_cache_stats("response", self.response_cache)
+        HYPERDB_DOCUMENTS.set_function(
+            lambda: len(self.vector_search_api.db) if self.vector_search_api.db is not None else 0
+        )
+        self.loading = None
+
+    async def start(self):
+        """Start loading the embeddings store in the background; requests are served meanwhile"""
+        if self.loading is None:
+            self.loading = asyncio.ensure_future(self._load_index())
+
+    async def stop(self):
+        await aclose_clients()
+
+    async def _load_index(self):
+        try:
+            await run_in_threadpool(self.vector_search_api.load)
+            logger.info(f"Embeddings store ready with {len(self.vector_search_api.db)} documents")
+        except Exception as e:
+            logger.error(f"Loading the embeddings store failed: {e}")
@@ -1,5 +1,7 @@
 from .global_config import GlobalConfig
-from langchain_community.llms import Ollama
+from .lib.summary_cache import SummaryCache, prefix_hashes
+from .lib.metrics import export_cache_stats
+from .ollama_clients import get_chat_client
 from langchain.chains import ConversationChain
 from langchain.chains.conversation.memory import ConversationBufferWindowMemory
 
@@ -7,19 +9,71 @@ config = GlobalConfig()
 
 class Summarizer:
     def __init__(self):
-        self.llm = Ollama(
-            model=config.ollama_chat_model,
-            base_url=config.ollama_base_url,
-            temperature=0.3
-        )
+        # Same pooled client and keep_alive as ChatCompletion, so summaries do not shorten how long the model stays loaded
+        self.client = get_chat_client()
+        self.options = {"temperature": 0.3}
+        self.cache = SummaryCache(
+            max_bytes=config.summary_cache_max_bytes, ttl=config.summary_cache_ttl
+        ) if config.summary_cache_max_bytes > 0 else None
+        if self.cache is not None:
+            export_cache_stats("summary", self.cache)
 
     def summarize(self, conversation):
         try:
-            # Convert conversation to text format
-            conversation_text = self._format_conversation(conversation)
+            hashes, prompt, cached_summary = self._rolling_prompt(conversation)
+            if cached_summary is not None:
+                return cached_summary
+            summary = self.client.client.generate(**self._request(prompt))["response"]
+            self._remember(hashes, summary)
+            return summary
             
-            # Create improved summarization prompt
-            prompt = f"""Please provide a concise summary of the following conversation. 
+        except Exception as e:
+            print(f'Error in summarization: {e}')
+            return "Unable to summarize conversation."
+
+    async def asummarize(self, conversation):
+        """Async summarize that awaits Ollama instead of blocking the event loop
+
+        Errors are raised rather than turned into a placeholder summary, so the
+        prompt pipeline records the summary stage as skipped.
+        """
+        hashes, prompt, cached_summary = self._rolling_prompt(conversation)
+        if cached_summary is not None:
+            return cached_summary
+        summary = (await self.client.async_client().generate(**self._request(prompt)))["response"]
+        self._remember(hashes, summary)
+        return summary
+
+    def _request(self, prompt):
+        return {
+            "model": config.ollama_chat_model,
+            "prompt": prompt,
+            "options": self.options,
+            "keep_alive": config.ollama_keep_alive,
+        }
+
+    def _rolling_prompt(self, conversation):
+        """Returns ``(hashes, prompt, cached_summary)``; the prompt folds only messages newer than the longest cached summary"""
+        if self.cache is None:
+            return None, self._summary_prompt(conversation), None
+        hashes = prefix_hashes(conversation)
+        summarized, previous_summary = self.cache.longest_prefix(hashes)
+        if summarized == len(conversation):
+            return hashes, None, previous_summary
+        if previous_summary is None:
+            return hashes, self._summary_prompt(conversation), None
+        return hashes, self._update_prompt(previous_summary, conversation[summarized:]), None
+
+    def _remember(self, hashes, summary):
+        if self.cache is not None and hashes:
+            self.cache.put(hashes[-1], summary)
+
+    def _summary_prompt(self, conversation):
+        # Convert conversation to text format
+        conversation_text = self._format_conversation(conversation)
+        
+        # Create improved summarization prompt
+        return f"""Please provide a concise summary of the following conversation. 
 IMPORTANT: Preserve and highlight key details such as:
 - Names, personal information, and user preferences
 - Important facts, dates, and specific details mentioned
@@ -31,13 +85,27 @@ Conversation to summarize:
 {conversation_text}
 
 Detailed Summary (preserving key information):"""
-            
-            summary = self.llm.invoke(prompt)
-            return summary
-            
-        except Exception as e:
-            print(f'Error in summarization: {e}')
-            return "Unable to summarize conversation."
+
+    def _update_prompt(self, previous_summary, new_messages):
+        new_text = self._format_conversation(new_messages)
+        
+        return f"""Below is a summary of a conversation so far, followed by the messages exchanged since.
+Update the summary so it also covers the new messages.
+IMPORTANT: Keep every key detail from the existing summary, and preserve:
+- Names, personal information, and user preferences
+- Important facts, dates, and specific details mentioned
+- Context that would be helpful for continuing the conversation
+- Any ongoing topics or questions
+
+Summary so far:
+
+{previous_summary}
+
+New messages:
+
+{new_text}
+
+Updated Detailed Summary (preserving key information):"""
 
     def _format_conversation(self, conversation):
         """Format conversation messages into readable text"""
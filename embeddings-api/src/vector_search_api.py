@@ -1,8 +1,20 @@
 from .lib.hyperdb import HyperDB
+from .lib.sharded_hyperdb import ShardedHyperDB
+from .lib import sharded_hyperdb, storage
 from .global_config import GlobalConfig
+from .context_packer import ContextPacker
+from .lib.metrics import CONTEXT_CHUNKS, CONTEXT_TOKENS, stage_timer
 import os
+import json
+import hashlib
+import itertools
 import logging
-from langchain.document_loaders import DirectoryLoader, TextLoader
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain.document_loaders import TextLoader
 from langchain.document_loaders.json_loader import JSONLoader
 from langchain.document_loaders import UnstructuredMarkdownLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -10,197 +22,436 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".markdown", ".json")
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _hash_file(file_path):
+    with open(file_path, "rb") as f:
+        return _hash_bytes(f.read())
+
+def _hash_chunk(document):
+    """Hash of everything the embedding is computed from, so equal hashes can share a vector"""
+    return _hash_bytes(json.dumps(document, sort_keys=True).encode("utf-8"))
+
+def _batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+def _load_file(file_path):
+    """Load a single file with the loader for its type"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".json":
+        return JSONLoader(file_path, jq_schema=".", text_content=False).load()
+    if extension in (".md", ".markdown"):
+        try:
+            return UnstructuredMarkdownLoader(file_path).load()
+        except Exception as e:
+            logger.error(f"Error loading {file_path}: {e}")
+            logger.info(f"Falling back to TextLoader for {file_path}")
+    return TextLoader(file_path, encoding="utf-8").load()
+
+def _load_and_split_file(file_path):
+    """Parse and chunk one file; runs in an ingestion worker process. Returns None if the file could not be loaded"""
+    try:
+        docs = _load_file(file_path)
+    except Exception as e:
+        logger.error(f"Error loading {file_path}: {e}")
+        return None
+    for doc in docs:
+        # Loaders disagree on relative vs resolved paths; key chunks by the walked path
+        doc.metadata["source"] = file_path
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    split_docs = text_splitter.split_documents(docs)
+    logger.info(f"Split {file_path} into {len(split_docs)} chunks")
+    return [
+        {
+            "content": doc.page_content,
+            "source": doc.metadata.get("source", "unknown"),
+            "description": doc.page_content  # This is what HyperDB will use for embedding
+        }
+        for doc in split_docs
+    ]
+
+class IndexNotReadyError(RuntimeError):
+    """Raised by searches while the store is still loading or failed to load"""
+
 class VectorSearchAPI:
-    def __init__(self):
+    def __init__(self, load=True):
+        """``load=False`` defers opening and indexing the store to ``load()``, e.g. on a background thread"""
         self.global_config = GlobalConfig()
         self.documents = []
-        self.pickle_path = f"embeddings/ollama_embeddings.pickle.gz"
+        self.context_packer = ContextPacker()
+        self.db = None
+        self.load_error = None
+        self.reindexing = False
+        # Serialises loading and reindexing; searches keep using the previous store meanwhile
+        self._index_lock = threading.RLock()
+        # Bumped whenever the store is opened or reindex replaces it, so caches of answers built on it can be dropped
+        self.index_version = 0
+        # Published version of the on-disk store that self.db maps
+        self.store_version = None
+        self.sharded = self.global_config.hyperdb_shards > 1
+        self.store_path = "embeddings/ollama_embeddings.shards" if self.sharded else "embeddings/ollama_embeddings.hyperdb"
+        self.legacy_pickle_path = "embeddings/ollama_embeddings.pickle.gz"
         
-        logger.info(f"Initializing VectorSearchAPI with pickle path: {self.pickle_path}")
+        logger.info(f"Initializing VectorSearchAPI with store path: {self.store_path}")
         logger.info(f"Data path configured as: {self.global_config.embeddings_data_path}")
-        
-        if os.path.isfile(self.pickle_path):
-            logger.info(f"Found existing embeddings file at {self.pickle_path}")
-            logger.info("Loading existing embeddings from pickle file...")
-            self.db = HyperDB()
-            self.db.load(self.pickle_path)
-            logger.info(f"Successfully loaded {len(self.db.documents)} documents from pickle file")
+        if load:
+            self.load()
+
+    @property
+    def ready(self):
+        """True once a store is mapped and searchable, which can be before the startup reindex finished"""
+        return self.db is not None
+
+    @property
+    def status(self):
+        if self.ready:
+            return "ready"
+        return "failed" if self.load_error is not None else "loading"
+
+    def load(self):
+        """Open the existing store (migrating a legacy pickle if needed) and bring it up to date with the data path"""
+        try:
+            with self._index_lock:
+                self._load()
+        except Exception as e:
+            self.load_error = e
+            raise
+
+    def _load(self):
+        if self._store_exists():
+            logger.info(f"Found existing embeddings store at {self.store_path}")
+            self._open_store()
+            logger.info(f"Successfully mapped {len(self.db)} documents from store")
+            if self.global_config.reindex_on_startup:
+                self.reindex()
+        elif os.path.isfile(self.legacy_pickle_path):
+            logger.info(f"Found legacy embeddings file at {self.legacy_pickle_path}")
+            logger.info("Migrating legacy pickle file to memory-mapped store...")
+            with storage.store_lock(self.store_path):
+                # Another worker may have migrated it while this one waited for the lock
+                if not self._store_exists():
+                    self._migrate_legacy_pickle()
+            self._open_store()
+            logger.info(f"Successfully migrated {len(self.db)} documents to {self.store_path}")
+            if self.global_config.reindex_on_startup:
+                self.reindex()
         else:
-            logger.info(f"No existing embeddings found at {self.pickle_path}")
+            logger.info(f"No existing embeddings found at {self.store_path}")
             logger.info("Starting fresh embedding generation process...")
-            self.load_and_process_documents()
-            logger.info(f"Creating HyperDB with {len(self.documents)} processed documents")
-            self.db = HyperDB(self.documents)
-            self.db.finalize()
-            logger.info("Saving generated embeddings to pickle file...")
-            self.db.save(self.pickle_path)
-            logger.info(f"Successfully saved embeddings to {self.pickle_path}")
-            logger.info(f"Pickle file size: {os.path.getsize(self.pickle_path) / (1024*1024):.2f} MB")
-
-    def load_and_process_documents(self):
-        """Load and process documents from the configured data path"""
+            self.reindex()
+            store_size = sharded_hyperdb.store_size if self.sharded else storage.store_size
+            logger.info(f"Store size: {store_size(self.store_path) / (1024*1024):.2f} MB")
+
+    def _migrate_legacy_pickle(self):
+        if self.sharded:
+            legacy_db = HyperDB.from_storage(self.legacy_pickle_path)
+            sharded_db = self._new_db()
+            sharded_db.add_documents(list(legacy_db.documents), legacy_db.vectors)
+            sharded_db.finalize()
+            legacy_db = sharded_db
+        else:
+            legacy_db = HyperDB.from_storage(self.legacy_pickle_path, **self._db_options())
+        legacy_db.save(self.store_path)
+
+    def reindex(self):
+        """Re-embed only new or changed source files and drop the chunks of deleted ones
+
+        Workers sharing the store take turns through a file lock; one that waited
+        picks up the store the previous one published before looking for changes.
+        """
+        with self._index_lock, storage.store_lock(self.store_path):
+            self.reindexing = True
+            try:
+                if self._store_exists() and self._store_version() != self.store_version:
+                    self._open_store()
+                return self._reindex()
+            finally:
+                self.reindexing = False
+
+    def _reindex(self):
         data_path = self.global_config.embeddings_data_path
-        
-        logger.info(f"Starting document loading from: {data_path}")
-        
-        if not os.path.exists(data_path):
-            logger.warning(f"Data path {data_path} does not exist. Creating empty database.")
-            return
-        
-        try:
-            # Load different types of documents
-            all_docs = []
-            
-            logger.info("Scanning for text files (.txt)...")
-            # Load text files
-            if self._has_files_with_extensions(data_path, ['.txt']):
-                logger.info("Found .txt files, loading...")
-                txt_loader = DirectoryLoader(
-                    data_path, 
-                    glob="**/*.txt", 
-                    loader_cls=TextLoader,
-                    loader_kwargs={'encoding': 'utf-8'}
-                )
-                txt_docs = txt_loader.load()
-                all_docs.extend(txt_docs)
-                logger.info(f"Loaded {len(txt_docs)} text files")
-            
-            logger.info("Scanning for markdown files (.md, .markdown)...")
-            # Load markdown files
-            if self._has_files_with_extensions(data_path, ['.md', '.markdown']):
-                logger.info("Found markdown files, loading...")
-                try:
-                    md_loader = DirectoryLoader(
-                        data_path, 
-                        glob="**/*.md", 
-                        loader_cls=UnstructuredMarkdownLoader
-                    )
-                    md_docs = md_loader.load()
-                    all_docs.extend(md_docs)
-                    logger.info(f"Loaded {len(md_docs)} .md files")
-                except Exception as e:
-                    logger.error(f"Error loading .md files: {e}")
-                    # Fallback to TextLoader for .md files
-                    logger.info("Falling back to TextLoader for .md files")
-                    md_loader = DirectoryLoader(
-                        data_path, 
-                        glob="**/*.md", 
-                        loader_cls=TextLoader,
-                        loader_kwargs={'encoding': 'utf-8'}
-                    )
-                    md_docs = md_loader.load()
-                    all_docs.extend(md_docs)
-                    logger.info(f"Loaded {len(md_docs)} .md files with TextLoader")
-                
-                # Also load .markdown files
-                try:
-                    markdown_loader = DirectoryLoader(
-                        data_path, 
-                        glob="**/*.markdown", 
-                        loader_cls=UnstructuredMarkdownLoader
-                    )
-                    markdown_docs = markdown_loader.load()
-                    all_docs.extend(markdown_docs)
-                    logger.info(f"Loaded {len(markdown_docs)} .markdown files")
-                except Exception as e:
-                    logger.error(f"Error loading .markdown files: {e}")
-                    # Fallback to TextLoader for .markdown files
-                    logger.info("Falling back to TextLoader for .markdown files")
-                    markdown_loader = DirectoryLoader(
-                        data_path, 
-                        glob="**/*.markdown", 
-                        loader_cls=TextLoader,
-                        loader_kwargs={'encoding': 'utf-8'}
-                    )
-                    markdown_docs = markdown_loader.load()
-                    all_docs.extend(markdown_docs)
-                    logger.info(f"Loaded {len(markdown_docs)} .markdown files with TextLoader")
-            
-            logger.info("Scanning for JSON files (.json)...")
-            # Load JSON files
-            if self._has_files_with_extensions(data_path, ['.json']):
-                logger.info("Found JSON files, loading...")
-                json_loader = DirectoryLoader(
-                    data_path, 
-                    glob="**/*.json", 
-                    loader_cls=JSONLoader,
-                    loader_kwargs={'jq_schema': '.', 'text_content': False}
-                )
-                json_docs = json_loader.load()
-                all_docs.extend(json_docs)
-                logger.info(f"Loaded {len(json_docs)} JSON files")
-            
-            logger.info(f"Total documents loaded: {len(all_docs)} from {data_path}")
-            
-            logger.info("Starting text splitting process...")
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                separators=["\n\n", "\n", " ", ""]
+        embeddings_model = self.global_config.ollama_embeddings_model
+        metadata = self.db.metadata if self.db is not None else {}
+        indexed_sources = metadata.get("sources", {})
+        # Vectors from another model cannot be reused or mixed with new ones
+        model_changed = metadata.get("embeddings_model", embeddings_model) != embeddings_model
+        if model_changed:
+            logger.info(f"Embeddings model changed to {embeddings_model}, re-embedding everything")
+            indexed_sources = {}
+
+        logger.info(f"Checking {data_path} for changed documents...")
+        sources = {}
+        changed_files = []
+        for file_path in self._find_source_files(data_path):
+            stat = os.stat(file_path)
+            previous = indexed_sources.get(file_path)
+            if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                sources[file_path] = previous
+                continue
+            file_hash = _hash_file(file_path)
+            sources[file_path] = {"hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if previous and previous["hash"] == file_hash:
+                sources[file_path]["chunks"] = previous["chunks"]
+            else:
+                changed_files.append(file_path)
+        deleted_files = [file_path for file_path in indexed_sources if file_path not in sources]
+
+        stats = {"changed_files": len(changed_files), "deleted_files": len(deleted_files), "removed_chunks": 0, "reused_chunks": 0, "embedded_chunks": 0, "failed_files": 0}
+        if self.db is not None and not changed_files and not deleted_files and sources == indexed_sources:
+            logger.info("Embeddings store is up to date")
+            return stats
+        logger.info(f"Found {len(changed_files)} new or changed and {len(deleted_files)} deleted files")
+
+        if self.db is None or model_changed:
+            db = self._new_db()
+        else:
+            db = self._open_db()
+
+        # Collect rows of stale sources; their vectors can be reused for chunks that did not change.
+        # A store without source records (e.g. migrated from pickle) is treated as entirely stale.
+        stale_sources = set(changed_files) | set(deleted_files)
+        stale_ids = []
+        reusable_vectors = {}
+        for doc_id, document, vector in db.items():
+            source = document.get("source") if isinstance(document, dict) else None
+            if not indexed_sources or source in stale_sources:
+                stale_ids.append(doc_id)
+                reusable_vectors[_hash_chunk(document)] = np.array(vector, dtype=np.float32)
+
+        # finalize() below compacts and builds the index once
+        for doc_id in stale_ids:
+            db.remove_document(doc_id, compact=False)
+
+        # Stream chunks from the parser pool straight into embedding and the index,
+        # one batch at a time, so memory is bounded by the batch size
+        for file_path in changed_files:
+            sources[file_path]["chunks"] = []
+        reused_chunks = embedded_chunks = 0
+        failed_files = []
+        for batch in _batched(self.iter_document_chunks(changed_files, failed_files), self.global_config.ingest_batch_size):
+            chunk_hashes = [_hash_chunk(document) for document in batch]
+            for document, chunk_hash in zip(batch, chunk_hashes):
+                sources[document["source"]]["chunks"].append(chunk_hash)
+
+            vectors = [reusable_vectors.get(chunk_hash) for chunk_hash in chunk_hashes]
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                logger.info(f"Embedding {len(missing)} new or changed chunks")
+                embedded = db.embedding_function([batch[i] for i in missing])
+                if len(embedded) != len(missing):
+                    raise RuntimeError("Failed to generate embeddings for changed documents")
+                for i, vector in zip(missing, embedded):
+                    vectors[i] = vector
+            db.add_documents(batch, vectors)
+            reused_chunks += len(batch) - len(missing)
+            embedded_chunks += len(missing)
+
+        # Leaving files that failed to load out of the source records makes the next reindex retry them
+        for file_path in failed_files:
+            del sources[file_path]
+        if failed_files:
+            logger.warning(f"{len(failed_files)} files failed to load and will be retried on the next reindex")
+            if self.db is not None and not model_changed and not stale_ids and sources == indexed_sources:
+                stats.update(failed_files=len(failed_files))
+                logger.info("Only files that failed to load changed, keeping the current store")
+                return stats
+
+        db.finalize()
+        db.save(self.store_path, metadata={"embeddings_model": embeddings_model, "sources": sources})
+        self._open_store()
+
+        stats.update(removed_chunks=len(stale_ids), reused_chunks=reused_chunks, embedded_chunks=embedded_chunks, failed_files=len(failed_files))
+        logger.info(f"Reindex complete: {stats}")
+        return stats
+
+    def _ready_db(self):
+        db = self.db
+        if db is None:
+            if self.load_error is not None:
+                raise IndexNotReadyError(f"Embeddings store failed to load: {self.load_error}")
+            raise IndexNotReadyError("Embeddings store is still loading")
+        return db
+
+    def _db_options(self):
+        options = {
+            "index": self.global_config.hyperdb_index,
+            "quantization": self.global_config.hyperdb_quantization,
+            "rerank": self.global_config.hyperdb_rerank,
+        }
+        if self.sharded:
+            options.update(
+                n_shards=self.global_config.hyperdb_shards,
+                search_threads=self.global_config.hyperdb_search_threads or None,
             )
-            
-            split_docs = text_splitter.split_documents(all_docs)
-            logger.info(f"Documents split into {len(split_docs)} chunks")
-            
-            logger.info("Processing chunks for embedding...")
-            # Extract text content for embedding
-            self.documents = []
-            for doc in split_docs:
-                # Create a document dict with metadata
-                doc_dict = {
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "unknown"),
-                    "description": doc.page_content  # This is what HyperDB will use for embedding
-                }
-                self.documents.append(doc_dict)
-            
-            logger.info(f"Prepared {len(self.documents)} document chunks for embedding generation")
-                
-        except Exception as e:
-            logger.error(f"Error loading documents: {e}")
-            self.documents = []
+        return options
+
+    def _store_exists(self):
+        if self.sharded:
+            return sharded_hyperdb.is_sharded_store(self.store_path)
+        return storage.is_store(self.store_path)
 
-    def _has_files_with_extensions(self, path, extensions):
-        """Check if directory contains files with specified extensions"""
+    def _new_db(self):
+        if self.sharded:
+            return ShardedHyperDB(**self._db_options())
+        return HyperDB(**self._db_options())
+
+    def _store_version(self):
+        return sharded_hyperdb.store_version(self.store_path) if self.sharded else storage.store_version(self.store_path)
+
+    def _open_store(self):
+        """Map the published store and serve searches from it"""
+        version = self._store_version()
+        # The replaced instance closes its document file once the last in-flight query drops it
+        self.db = self._open_db()
+        self.store_version = version
+        self.index_version += 1
+
+    def _open_db(self):
+        db_class = ShardedHyperDB if self.sharded else HyperDB
+        return db_class.from_storage(self.store_path, **self._db_options())
+
+    def _find_source_files(self, data_path):
+        """Walk the data path once and return every supported file"""
+        if not os.path.exists(data_path):
+            logger.warning(f"Data path {data_path} does not exist. Creating empty database.")
+            return []
         found_files = []
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if any(file.lower().endswith(ext) for ext in extensions):
+        for root, dirs, files in os.walk(data_path):
+            for file in sorted(files):
+                if file.lower().endswith(SUPPORTED_EXTENSIONS):
                     found_files.append(os.path.join(root, file))
-        
-        if found_files:
-            logger.info(f"Found {len(found_files)} files with extensions {extensions}")
-            for file in found_files:  # Log all files for debugging
-                logger.info(f"  - {file}")
-        
-        return len(found_files) > 0
+        logger.info(f"Found {len(found_files)} files with extensions {list(SUPPORTED_EXTENSIONS)}")
+        return sorted(found_files)
+
+    def iter_document_chunks(self, file_paths, failed=None):
+        """Yield chunk dicts for the given files in order, parsing them in a process pool.
 
-    def get_embeddings(self, query_text):
-        """Get relevant embeddings for a query"""
+        At most two files per worker are in flight, so parsing overlaps with whatever
+        the consumer does with the chunks without loading the whole corpus at once.
+        Files that fail to load yield nothing and are appended to ``failed`` if given.
+        """
+        workers = self.global_config.ingest_workers
+        logger.info(f"Starting document loading for {len(file_paths)} files with {workers} workers")
+        if workers <= 1:
+            for file_path in file_paths:
+                yield from self._file_chunks(file_path, _load_and_split_file(file_path), failed)
+            return
+
+        # Spawn fresh workers: forking the server process would copy locks held by its event loop and threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = deque()
+            file_iter = iter(file_paths)
+            for file_path in itertools.islice(file_iter, workers * 2):
+                pending.append((file_path, executor.submit(_load_and_split_file, file_path)))
+            while pending:
+                file_path, future = pending.popleft()
+                chunks = future.result()
+                for next_path in itertools.islice(file_iter, 1):
+                    pending.append((next_path, executor.submit(_load_and_split_file, next_path)))
+                yield from self._file_chunks(file_path, chunks, failed)
+
+    @staticmethod
+    def _file_chunks(file_path, chunks, failed):
+        if chunks is None:
+            if failed is not None:
+                failed.append(file_path)
+            return []
+        return chunks
+
+    def load_and_process_documents(self, file_paths=None):
+        """Load and split the given files (default: everything under the data path) into self.documents"""
+        if file_paths is None:
+            file_paths = self._find_source_files(self.global_config.embeddings_data_path)
+        self.documents = list(self.iter_document_chunks(file_paths))
+        logger.info(f"Prepared {len(self.documents)} document chunks for embedding generation")
+
+    def get_embeddings(self, query_text, filter=None, mode=None):
+        """Get relevant embeddings for a query, optionally restricted by a metadata filter"""
         logger.info(f"Processing query for embeddings: {str(query_text)[:100]}...")
         
         if isinstance(query_text, dict):
             query_text = query_text.get("content", str(query_text))
         
         logger.info("Performing vector similarity search...")
-        results = self.db.query(query_text, top_k=50)
+        mode = mode or self.global_config.hyperdb_search_mode
+        results = self._ready_db().query(query_text, top_k=50, filter=filter, mode=mode)
+        return self._context_from_results(results, mode)
+
+    async def aget_embeddings(self, query_text, filter=None, mode=None, query_vector=None):
+        """Async get_embeddings for request handlers running on the event loop; reuses ``query_vector`` if given"""
+        logger.info(f"Processing async query for embeddings: {str(query_text)[:100]}...")
+        
+        if isinstance(query_text, dict):
+            query_text = query_text.get("content", str(query_text))
+        
+        mode = mode or self.global_config.hyperdb_search_mode
+        db = self._ready_db()
+        if mode != "lexical" and query_vector is None and len(db):
+            query_vector = await db.aembed_query(query_text)
+            if query_vector is None:
+                # Raised so the prompt pipeline records retrieval as skipped instead of answering without context
+                raise RuntimeError("Failed to generate query embedding")
+        results = await db.aquery(
+            query_text,
+            top_k=50,
+            filter=filter,
+            mode=mode,
+            query_vector=query_vector,
+        )
+        return self._context_from_results(results, mode)
+
+    async def aembed_query(self, query_text):
+        """Embed a query with the store's embedding model; None if embedding failed"""
+        if isinstance(query_text, dict):
+            query_text = query_text.get("content", str(query_text))
+        if not self.ready:
+            return None
+        return await self.db.aembed_query(query_text)
+
+    def _context_from_results(self, results, mode):
         logger.info(f"Found {len(results)} relevant document chunks")
         
-        # Extract the content from results
-        embeddings = []
-        for result in results:
-            if isinstance(result, tuple):
-                doc, similarity = result
-                if isinstance(doc, dict):
-                    embeddings.append(doc.get("description", str(doc)))
-                else:
-                    embeddings.append(str(doc))
-            else:
-                if isinstance(result, dict):
-                    embeddings.append(result.get("description", str(result)))
-                else:
-                    embeddings.append(str(result))
+        # Dedupe, stitch and trim the chunks to the context token budget
+        with stage_timer("context"):
+            embeddings, stats = self.context_packer.pack(results, mode)
+        CONTEXT_CHUNKS.labels("retrieved").inc(stats["retrieved_chunks"])
+        CONTEXT_CHUNKS.labels("packed").inc(stats["kept_chunks"])
+        CONTEXT_TOKENS.labels("retrieved").inc(stats["retrieved_tokens"])
+        CONTEXT_TOKENS.labels("packed").inc(stats["context_tokens"])
         
         logger.info(f"Returning {len(embeddings)} embedding results for context")
-        return embeddings
\ No newline at end of file
+        return embeddings
+
+    def search_batch(self, query_texts, top_k=5, filter=None, mode=None):
+        """Search many queries at once; returns one list of scored chunks per query"""
+        logger.info(f"Processing batch search for {len(query_texts)} queries")
+        query_texts = [
+            query_text.get("content", str(query_text)) if isinstance(query_text, dict) else query_text
+            for query_text in query_texts
+        ]
+        batch_results = self._ready_db().query_batch(
+            query_texts, top_k=top_k, filter=filter, mode=mode or self.global_config.hyperdb_search_mode
+        )
+
+        search_results = []
+        for results in batch_results:
+            search_results.append([
+                {
+                    "content": doc.get("description", str(doc)) if isinstance(doc, dict) else str(doc),
+                    "source": doc.get("source", "unknown") if isinstance(doc, dict) else "unknown",
+                    "similarity": float(similarity),
+                }
+                for doc, similarity in results
+            ])
+        logger.info(f"Returning batch search results for {len(search_results)} queries")
+        return search_results